@@ -67,6 +67,8 @@ def plugin_loaded():
         return
 
     cli.initialize()
+    for window in sublime.windows():
+        cli.prewarm_window(window)
     ref_view = get_ref_view(False)
     if ref_view:
         settings = ref_view.settings()
@@ -102,5 +104,7 @@ def plugin_unloaded():
         ref_info = cli.get_ref_info()
         if ref_info:
             ref_view.settings().set('refinfo', ref_info.as_value())
+    cli.client_manager.stop()
     for client in cli.client_manager.get_clients():
         client.exit()
+    logger.stop()
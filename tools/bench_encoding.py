@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measures the bytes on the wire and the encode time of full-text didChange
+notifications, as format_request sends them and as the indented ASCII
+JSON of earlier versions did.
+
+Each buffer is a Go source of --size bytes: one plain ASCII, one with
+comments and strings in other scripts, where escaping every character as
+\\uXXXX used to inflate the payload.
+
+    python3 tools/bench_encoding.py --size 1048576 --repeat 20
+"""
+
+import argparse
+import json
+import time
+
+import bench_env
+from typescript.libs.lsp_helpers import convert_cmd, format_request
+
+ASCII_LINES = [
+    "func handle(w http.ResponseWriter, r *http.Request) {\n",
+    "\tif err := r.ParseForm(); err != nil {\n",
+    "\t\thttp.Error(w, err.Error(), http.StatusBadRequest)\n",
+    "\t\treturn\n",
+    "\t}\n",
+    "}\n",
+]
+NON_ASCII_LINES = ASCII_LINES + [
+    "\t// Überprüft die Eingabe, bevor sie gespeichert wird\n",
+    "\tgreeting := \"こんにちは、世界\"\n",
+    "\tlog.Printf(\"задача %d завершена\", id)\n",
+]
+
+
+def make_buffer(lines, size):
+    """A source text of about <size> UTF-8 bytes built from <lines>"""
+    text = []
+    length = 0
+    while length < size:
+        for line in lines:
+            text.append(line)
+            length += len(line.encode("utf-8"))
+    return "".join(text)
+
+
+def did_change(text):
+    return convert_cmd({
+        "command": "change",
+        "seq": 42,
+        "type": "request",
+        "arguments": {"file": "/tmp/bench/main.go", "version": 7, "changes": [{"text": text}]}
+    })
+
+
+def format_request_indented(request):
+    """The encoding format_request used before: indented ASCII JSON"""
+    content = json.dumps(request, indent=2)
+    return "Content-Length: {}\r\n\r\n{}".format(len(content), content).encode("utf-8")
+
+
+def measure(encode, request, repeat):
+    """(bytes of the frame, fastest encode in seconds) over <repeat> runs"""
+    best = None
+    for _ in range(repeat):
+        started = time.time()
+        frame = encode(request)
+        seconds = time.time() - started
+        best = seconds if best is None else min(best, seconds)
+    return len(frame), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="bytes of source per buffer")
+    parser.add_argument("--repeat", type=int, default=10, help="encodes per measurement; the fastest counts")
+    args = parser.parse_args()
+
+    for name, lines in (("ascii", ASCII_LINES), ("non-ascii", NON_ASCII_LINES)):
+        request = did_change(make_buffer(lines, args.size))
+        for encoding, encode in (("compact", format_request), ("indented", format_request_indented)):
+            size, seconds = measure(encode, request, args.repeat)
+            print("%-9s %-8s  %8.3f MB on the wire  %7.2f ms to encode" % (
+                name, encoding, size / (1024.0 * 1024.0), seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
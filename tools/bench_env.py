@@ -0,0 +1,93 @@
+"""
+Lets the benchmarks in this directory import the plugin outside Sublime Text.
+
+Importing this module puts the plugin root on sys.path and, unless the real
+sublime module is importable (e.g. when run from the Sublime console),
+registers minimal sublime and sublime_plugin modules: settings are plain
+dicts, set_timeout runs callbacks on timer threads, and there are no
+windows or views. That is enough for everything below the editor layer:
+LspClientManager, ServiceProxy, the LSP clients and their helpers.
+"""
+
+import os
+import sys
+import threading
+import types
+
+PLUGIN_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAND_IN_SERVER = os.path.join(PLUGIN_ROOT, "tools", "stand_in_server.py")
+
+if PLUGIN_ROOT not in sys.path:
+    sys.path.insert(0, PLUGIN_ROOT)
+
+
+class Settings(dict):
+
+    def set(self, key, value):
+        self[key] = value
+
+    def add_on_change(self, key, callback):
+        pass
+
+    def clear_on_change(self, key):
+        pass
+
+
+class Region(object):
+
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return self.end() - self.begin()
+
+    def empty(self):
+        return self.a == self.b
+
+
+def _set_timeout(callback, delay=0):
+    timer = threading.Timer(delay / 1000.0, callback)
+    timer.daemon = True
+    timer.start()
+
+
+def _install_shims():
+    settings = {}
+    sublime = types.ModuleType("sublime")
+    sublime.version = lambda: "3176"
+    sublime.platform = lambda: sys.platform
+    sublime.load_settings = lambda name: settings.setdefault(name, Settings())
+    sublime.set_timeout = _set_timeout
+    sublime.set_timeout_async = _set_timeout
+    sublime.packages_path = lambda: os.path.dirname(PLUGIN_ROOT)
+    sublime.active_window = lambda: None
+    sublime.windows = lambda: []
+    sublime.status_message = lambda message: None
+    sublime.Region = Region
+    for flag, value in (("HIDDEN", 128), ("DRAW_EMPTY", 1), ("DRAW_OUTLINED", 32), ("DRAW_NO_FILL", 32),
+                        ("DRAW_NO_OUTLINE", 512), ("DRAW_SOLID_UNDERLINE", 2048), ("DRAW_SQUIGGLY_UNDERLINE", 1024),
+                        ("COOPERATE_WITH_AUTO_COMPLETE", 2), ("HIDE_ON_MOUSE_MOVE_AWAY", 2), ("HOVER_TEXT", 1),
+                        ("INHIBIT_WORD_COMPLETIONS", 8), ("INHIBIT_EXPLICIT_COMPLETIONS", 16),
+                        ("ENCODED_POSITION", 1)):
+        setattr(sublime, flag, value)
+
+    sublime_plugin = types.ModuleType("sublime_plugin")
+    for name in ("EventListener", "TextCommand", "WindowCommand", "ApplicationCommand"):
+        setattr(sublime_plugin, name, type(name, (object,), {}))
+
+    sys.modules["sublime"] = sublime
+    sys.modules["sublime_plugin"] = sublime_plugin
+
+
+try:
+    import sublime
+except ImportError:
+    _install_shims()
+
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Measures how fast FrameReader splits a server's output into messages.
+
+The incoming frames of a trace recorded with "trace_directory" (an
+.lsptrace file) are replayed through a pipe, the way the reader thread
+sees the stdout of a server, and read once with FrameReader and once with
+a reader that parses the headers line by line like the reader thread did
+before it. Without --trace a stream of diagnostics notifications and
+completion responses of mixed sizes is synthesized instead.
+
+    python3 tools/bench_frame_reader.py --trace ~/traces/gopls-1234.lsptrace
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import bench_env
+from typescript.libs.frame_reader import FrameReader
+from typescript.libs.lsp_helpers import frame_body
+from typescript.libs.traffic_trace import INCOMING, read_trace
+
+CONTENT_LENGTH_HEADER = b"Content-Length: "
+
+
+def load_trace(path):
+    """The incoming frames of the trace at <path>, as one byte string"""
+    return b"".join(frame_body(body) for timestamp, direction, body in read_trace(path) if direction == INCOMING)
+
+
+def synthesize(count):
+    """<count> frames: mostly small notifications, every tenth a large completion list"""
+    frames = []
+    for index in range(count):
+        if index % 10 == 9:
+            items = [{"label": "item{0}".format(item), "kind": 3, "detail": "func() error"} for item in range(500)]
+            message = {"jsonrpc": "2.0", "id": index, "result": {"isIncomplete": False, "items": items}}
+        else:
+            diagnostic = {"range": {"start": {"line": index, "character": 0}, "end": {"line": index, "character": 8}},
+                          "severity": 1, "message": "undefined: fmt"}
+            message = {"jsonrpc": "2.0", "method": "textDocument/publishDiagnostics",
+                       "params": {"uri": "file:///tmp/main.go", "diagnostics": [diagnostic] * (index % 4)}}
+        frames.append(frame_body(json.dumps(message).encode("utf-8")))
+    return b"".join(frames)
+
+
+class CountingFileIO(io.FileIO):
+    """The read end of the pipe, counting the reads from it"""
+
+    def __init__(self, fd):
+        super(CountingFileIO, self).__init__(fd, "rb")
+        self.reads = 0
+
+    def readinto(self, buffer):
+        self.reads += 1
+        return super(CountingFileIO, self).readinto(buffer)
+
+
+def replay(stream_bytes, read):
+    """
+    Writes <stream_bytes> to a pipe and returns (seconds, frames, reads) for
+    <read> draining it from a buffered stream like Popen.stdout
+    """
+    read_fd, write_fd = os.pipe()
+
+    def write():
+        with os.fdopen(write_fd, "wb") as pipe:
+            pipe.write(stream_bytes)
+
+    writer = threading.Thread(target=write)
+    writer.daemon = True
+    raw = CountingFileIO(read_fd)
+    with io.BufferedReader(raw) as stream:
+        started = time.time()
+        writer.start()
+        frames = read(stream)
+        seconds = time.time() - started
+    writer.join()
+    return seconds, frames, raw.reads
+
+
+def read_chunked(stream):
+    reader = FrameReader(stream)
+    frames = 0
+    while reader.fill():
+        for body in reader.frames():
+            str(body, "utf-8")
+            frames += 1
+    return frames
+
+
+def read_line_by_line(stream):
+    frames = 0
+    while True:
+        body_length = -1
+        while True:
+            header = stream.readline()
+            if not header:
+                return frames
+            header = header.strip()
+            if not header:
+                break
+            if header.startswith(CONTENT_LENGTH_HEADER):
+                body_length = int(header[len(CONTENT_LENGTH_HEADER):])
+        stream.read(body_length).decode("utf-8")
+        frames += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="replay the incoming frames of this .lsptrace file")
+    parser.add_argument("--frames", type=int, default=20000, help="frames to synthesize without --trace")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per reader; the fastest counts")
+    args = parser.parse_args()
+
+    stream_bytes = load_trace(args.trace) if args.trace else synthesize(args.frames)
+    if not stream_bytes:
+        sys.exit("The trace has no incoming frames")
+    megabytes = len(stream_bytes) / (1024.0 * 1024.0)
+    print("stream      %.1f MB" % megabytes)
+    for name, read in (("chunked", read_chunked), ("line-based", read_line_by_line)):
+        seconds, frames, reads = min(replay(stream_bytes, read) for _ in range(args.repeat))
+        print("%-11s %6d frames in %7.2f ms  %8.1f MB/s  %9.0f frames/s  %7d reads" % (
+            name, frames, seconds * 1000, megabytes / seconds, frames / seconds, reads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Measures the round trip of ServiceProxy requests against the stand-in
+server, started through LspClientManager like a configured client.
+
+Two phases run against the same server:
+
+    latency     sequential definition requests, one in flight at a time;
+                reports the percentiles of their round trip
+    throughput  completion requests kept in flight on --concurrency
+                documents at once (one per document, so none supersedes
+                another); reports requests per second and the percentiles
+
+Options after "--" are passed to the stand-in server, e.g.
+
+    python3 tools/bench_stand_in.py --requests 2000 -- --latency 5 --jitter 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import bench_env
+from typescript.libs.client_manager import LspClientManager
+from typescript.libs.request_stats import percentile
+from typescript.libs.text_helpers import Location
+
+DOCUMENT_TEXT = "package main\n\nfunc main() {\n\tfmt.Println(\"hello\")\n}\n"
+# seconds to wait for the server to answer initialize
+STARTUP_TIMEOUT = 10
+
+
+def report(name, latencies, seconds):
+    # the nearest-rank percentiles of the stats panel
+    ordered = sorted(latency * 1000 for latency in latencies)
+    print("%-10s %6d requests in %6.2f s  %8.1f req/s  p50 %7.2f ms  p95 %7.2f ms  p99 %7.2f ms" % (
+        name, len(latencies), seconds, len(latencies) / seconds if seconds else 0,
+        percentile(ordered, 50), percentile(ordered, 95), percentile(ordered, 99)))
+
+
+def wait_for_startup(service):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while service.get_startup_time() is None:
+        if time.time() > deadline:
+            sys.exit("The stand-in server did not initialize within %s s" % STARTUP_TIMEOUT)
+        time.sleep(0.01)
+    print("startup    %.2f ms" % (service.get_startup_time() * 1000))
+
+
+def bench_latency(service, path, count):
+    latencies = []
+    started = time.time()
+    for _ in range(count):
+        sent = time.time()
+        service.definition(path, Location(4, 6))
+        latencies.append(time.time() - sent)
+    report("latency", latencies, time.time() - started)
+
+
+def bench_throughput(service, paths, count):
+    lock = threading.Lock()
+    finished = threading.Event()
+    latencies = []
+    state = {"sent": 0}
+
+    def send(path):
+        with lock:
+            if state["sent"] >= count:
+                return
+            state["sent"] += 1
+        sent = time.time()
+        seq = service.async_completions(path, Location(4, 6), "", lambda response: on_response(path, sent))
+        if seq is None:
+            sys.exit("The completion request for %s was not sent" % path)
+
+    def on_response(path, sent):
+        with lock:
+            latencies.append(time.time() - sent)
+            done = len(latencies) == count
+        if done:
+            finished.set()
+        else:
+            send(path)
+
+    started = time.time()
+    for path in paths:
+        send(path)
+    if not finished.wait(max(60, count / 10.0)):
+        sys.exit("Only %s of %s completion requests were answered" % (len(latencies), count))
+    report("throughput", latencies, time.time() - started)
+
+
+def main():
+    argv = sys.argv[1:]
+    server_args = []
+    if "--" in argv:
+        server_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per phase")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight in the throughput phase")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="bench_stand_in")
+    manager = LspClientManager()
+    manager.register_extensions(["go"], sys.executable, [bench_env.STAND_IN_SERVER] + server_args,
+                                dict(os.environ))
+    service = manager.get_client("go", root)
+    if service is None:
+        sys.exit("Could not start the stand-in server")
+    try:
+        wait_for_startup(service)
+        paths = [os.path.join(root, "main{0}.go".format(index)) for index in range(max(args.concurrency, 1))]
+        for path in paths:
+            service.open(path, DOCUMENT_TEXT)
+        bench_latency(service, paths[0], args.requests)
+        bench_throughput(service, paths, args.requests)
+    finally:
+        service.exit()
+        os.rmdir(root)
+
+
+if __name__ == "__main__":
+    main()
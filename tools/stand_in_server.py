@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+A stand-in language server for measuring the plugin without gopls or
+tsserver.
+
+It speaks LSP over stdio and answers hover, definition, references,
+completion (with completionItem/resolve), signature help and document
+highlight requests from fixtures, and publishes fixture diagnostics after
+every didOpen and didChange. Every reply can be delayed, jittered,
+reordered, padded or cut short by a crash.
+It does not import sublime and runs with any Python 3.
+
+Register it like a real server in SublimeLsp.sublime-settings:
+
+    "clients": [
+        {
+            "binary": "python3",
+            "args": ["/path/to/tools/stand_in_server.py", "--latency", "50", "--jitter", "20"],
+            "file_exts": ["go"]
+        }
+    ]
+
+Run it with --help for the list of options.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+
+# JSON-RPC error codes
+METHOD_NOT_FOUND = -32601
+REQUEST_CANCELLED = -32800
+
+# seconds after which an incomplete batch of held replies is sent anyway
+REORDER_FLUSH_DELAY = 0.1
+
+# "$uri" in a fixture stands for the document of the request
+URI_PLACEHOLDER = "$uri"
+
+DEFAULT_FIXTURES = {
+    "hover": {
+        "contents": [{"language": "go", "value": "func Example(a int, b string) error"}, "Example does nothing."],
+        "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 7}}
+    },
+    "definition": [
+        {"uri": URI_PLACEHOLDER, "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 7}}}
+    ],
+    "references": [
+        {"uri": URI_PLACEHOLDER, "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 7}}},
+        {"uri": URI_PLACEHOLDER, "range": {"start": {"line": 2, "character": 4}, "end": {"line": 2, "character": 11}}}
+    ],
+    "completion": {
+        "isIncomplete": False,
+        "items": [
+            {"label": "Example", "kind": 3, "detail": "func(a int, b string) error"},
+            {"label": "ExampleType", "kind": 7, "detail": "struct"},
+            {"label": "exampleVar", "kind": 6, "detail": "int"}
+        ]
+    },
+    "signatureHelp": {
+        "signatures": [{
+            "label": "Example(a int, b string) error",
+            "parameters": [{"label": "a int"}, {"label": "b string"}]
+        }],
+        "activeSignature": 0,
+        "activeParameter": 0
+    },
+    "documentHighlight": [
+        {"range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 7}}, "kind": 1}
+    ],
+    "diagnostics": [
+        {"range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 1}},
+         "severity": 2, "source": "stand-in", "message": "stand-in diagnostic"}
+    ]
+}
+
+# request method -> fixture key
+REQUEST_FIXTURES = {
+    "textDocument/hover": "hover",
+    "textDocument/definition": "definition",
+    "textDocument/references": "references",
+    "textDocument/completion": "completion",
+    "textDocument/signatureHelp": "signatureHelp",
+    "textDocument/documentHighlight": "documentHighlight"
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Stand-in LSP server answering from fixtures")
+    parser.add_argument("--fixtures", help="JSON file overriding the built-in fixtures, keyed like DEFAULT_FIXTURES")
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds before every reply")
+    parser.add_argument("--jitter", type=float, default=0, help="random extra milliseconds, 0 to this value, per reply")
+    parser.add_argument("--reorder", type=int, default=0,
+                        help="hold replies back and send them in shuffled batches of this size")
+    parser.add_argument("--payload-size", type=int, default=0,
+                        help="pad hover text and completion lists to about this many bytes")
+    parser.add_argument("--crash-after", type=int, default=0, help="exit abruptly when this request arrives")
+    parser.add_argument("--crash-probability", type=float, default=0,
+                        help="chance of exiting abruptly on any request")
+    parser.add_argument("--hang-after", type=int, default=0, help="stop replying from this request on")
+    parser.add_argument("--seed", type=int, help="seed for jitter, reordering and crashes")
+    parser.add_argument("--verbose", action="store_true", help="log every message to stderr")
+    return parser.parse_args(argv)
+
+
+def load_fixtures(path):
+    fixtures = dict(DEFAULT_FIXTURES)
+    if path:
+        with open(path) as fixture_file:
+            fixtures.update(json.load(fixture_file))
+    return fixtures
+
+
+def substitute_uri(value, uri):
+    """Replaces URI_PLACEHOLDER anywhere in a fixture"""
+    if value == URI_PLACEHOLDER:
+        return uri
+    if isinstance(value, dict):
+        return dict((key, substitute_uri(item, uri)) for key, item in value.items())
+    if isinstance(value, list):
+        return [substitute_uri(item, uri) for item in value]
+    return value
+
+
+def pad_result(key, result, size):
+    """Blows a hover or completion result up to about <size> bytes"""
+    if key == "hover":
+        result = dict(result)
+        result["contents"] = list(result["contents"]) + ["x" * size]
+    elif key == "completion":
+        items = result["items"]
+        item_size = max(len(json.dumps(items[0])), 1)
+        count = max(size // item_size, 1)
+        padded = []
+        for index in range(count):
+            item = dict(items[index % len(items)])
+            item["label"] = "{0}{1}".format(item["label"], index)
+            padded.append(item)
+        result = {"isIncomplete": result.get("isIncomplete", False), "items": padded}
+    return result
+
+
+class StandInServer(object):
+
+    def __init__(self, options, stdin, stdout):
+        self.options = options
+        self.stdin = stdin
+        self.stdout = stdout
+        self.fixtures = load_fixtures(options.fixtures)
+        self.random = random.Random(options.seed)
+        self.write_lock = threading.Lock()
+        # ids of requests that have not been answered yet; replies on timer
+        # threads and cancellations on the read loop claim them under the lock
+        self.pending_lock = threading.Lock()
+        self.pending = set()
+        # replies held back for reordering
+        self.held = []
+        self.request_count = 0
+        self.shutting_down = False
+
+    def log(self, message):
+        if self.options.verbose:
+            sys.stderr.write(message + "\n")
+            sys.stderr.flush()
+
+    def read_message(self):
+        """Returns the next message, or None once stdin is closed"""
+        length = None
+        while True:
+            line = self.stdin.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value.strip())
+        if length is None:
+            return self.read_message()
+        return json.loads(self.stdin.read(length).decode("utf-8"))
+
+    def send(self, message):
+        body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        with self.write_lock:
+            self.stdout.write(("Content-Length: %d\r\n\r\n" % len(body)).encode("ascii") + body)
+            self.stdout.flush()
+
+    def delay(self):
+        """Seconds before the next reply"""
+        return (self.options.latency + self.random.uniform(0, self.options.jitter)) / 1000.0
+
+    def reply_later(self, message):
+        """Sends <message> after the configured latency, possibly out of order"""
+        timer = threading.Timer(self.delay(), self.release, args=(message,))
+        timer.daemon = True
+        timer.start()
+
+    def release(self, message):
+        if self.options.reorder <= 1:
+            self.deliver(message)
+            return
+        with self.write_lock:
+            self.held.append(message)
+            if len(self.held) == 1:
+                timer = threading.Timer(REORDER_FLUSH_DELAY, self.flush_held)
+                timer.daemon = True
+                timer.start()
+            if len(self.held) < self.options.reorder:
+                return
+        self.flush_held()
+
+    def flush_held(self):
+        with self.write_lock:
+            batch, self.held = self.held, []
+        self.random.shuffle(batch)
+        for held_message in batch:
+            self.deliver(held_message)
+
+    def claim(self, req_id):
+        """True for the one caller that gets to answer request <req_id>"""
+        with self.pending_lock:
+            if req_id not in self.pending:
+                return False
+            self.pending.discard(req_id)
+            return True
+
+    def deliver(self, message):
+        if "id" in message and "method" not in message and not self.claim(message["id"]):
+            # cancelled and answered already
+            return
+        self.send(message)
+
+    def check_faults(self):
+        """Crashes or hangs as configured; returns True if the request must go unanswered"""
+        self.request_count += 1
+        if self.options.crash_after and self.request_count >= self.options.crash_after:
+            self.log("crashing on request {0}".format(self.request_count))
+            os._exit(3)
+        if self.options.crash_probability and self.random.random() < self.options.crash_probability:
+            self.log("crashing at random on request {0}".format(self.request_count))
+            os._exit(3)
+        return bool(self.options.hang_after and self.request_count >= self.options.hang_after)
+
+    def handle_request(self, message):
+        method = message["method"]
+        req_id = message["id"]
+        if method == "initialize":
+            self.send({"jsonrpc": "2.0", "id": req_id, "result": {"capabilities": self.capabilities()}})
+            return
+        if method == "shutdown":
+            self.shutting_down = True
+            self.send({"jsonrpc": "2.0", "id": req_id, "result": None})
+            return
+        if self.check_faults():
+            return
+
+        with self.pending_lock:
+            self.pending.add(req_id)
+        key = REQUEST_FIXTURES.get(method)
+        if method == "completionItem/resolve":
+            # the item comes back with its documentation filled in
+            item = dict(message.get("params", {}))
+            item.setdefault("documentation", "Documentation of {0}.".format(item.get("label", "")))
+            reply = {"jsonrpc": "2.0", "id": req_id, "result": item}
+        elif key is None:
+            reply = {"jsonrpc": "2.0", "id": req_id,
+                     "error": {"code": METHOD_NOT_FOUND, "message": "{0} is not supported".format(method)}}
+        else:
+            uri = message.get("params", {}).get("textDocument", {}).get("uri", "")
+            result = substitute_uri(self.fixtures.get(key), uri)
+            if self.options.payload_size and result:
+                result = pad_result(key, result, self.options.payload_size)
+            reply = {"jsonrpc": "2.0", "id": req_id, "result": result}
+        self.reply_later(reply)
+
+    def handle_notification(self, message):
+        method = message["method"]
+        params = message.get("params", {})
+        if method == "exit":
+            sys.exit(0 if self.shutting_down else 1)
+        elif method == "$/cancelRequest":
+            req_id = params.get("id")
+            if self.claim(req_id):
+                self.send({"jsonrpc": "2.0", "id": req_id,
+                           "error": {"code": REQUEST_CANCELLED, "message": "cancelled"}})
+        elif method in ("textDocument/didOpen", "textDocument/didChange"):
+            uri = params["textDocument"]["uri"]
+            self.reply_later({
+                "jsonrpc": "2.0",
+                "method": "textDocument/publishDiagnostics",
+                "params": {"uri": uri, "diagnostics": substitute_uri(self.fixtures.get("diagnostics", []), uri)}
+            })
+
+    def capabilities(self):
+        return {
+            "textDocumentSync": 2,
+            "hoverProvider": "hover" in self.fixtures,
+            "definitionProvider": "definition" in self.fixtures,
+            "referencesProvider": "references" in self.fixtures,
+            "completionProvider": {"triggerCharacters": ["."], "resolveProvider": True}
+            if "completion" in self.fixtures else None,
+            "signatureHelpProvider": {"triggerCharacters": ["(", ","]} if "signatureHelp" in self.fixtures else None,
+            "documentHighlightProvider": "documentHighlight" in self.fixtures,
+            "workspace": {"workspaceFolders": {"supported": True, "changeNotifications": True}}
+        }
+
+    def serve(self):
+        while True:
+            message = self.read_message()
+            if message is None:
+                return
+            self.log("<- {0}".format(message.get("method", message.get("id"))))
+            if "id" in message and "method" in message:
+                self.handle_request(message)
+            elif "method" in message:
+                self.handle_notification(message)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    StandInServer(options, sys.stdin.buffer, sys.stdout.buffer).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,9 @@ from .settings import (
     # TypescriptOpenTsreactDefaultSettingFile
 )
 from .browse import BrowseCode
+from .server_log import TypescriptShowServerLog
+from .trace import TypescriptReplayTrace
+from .stats import TypescriptShowStats
 
 __all__ = [
     "TypescriptAutoIndentOnEnterBetweenCurlyBrackets",
@@ -71,5 +74,8 @@ __all__ = [
     "TypescriptOpenPluginDefaultSettingFile",
     "TypescriptOpenTsDefaultSettingFile",
     # "TypescriptOpenTsreactDefaultSettingFile"
-    "BrowseCode"
+    "BrowseCode",
+    "TypescriptShowServerLog",
+    "TypescriptReplayTrace",
+    "TypescriptShowStats"
 ]
@@ -18,7 +18,7 @@ class TypescriptNavToCommand(TypeScriptBaseWindowCommand):
         cls.insert_text_finished = False
 
     def run(self, input_text=""):
-        logger.log.debug("start running nav_to with text: %s" % input_text)
+        logger.log.debug("start running nav_to with text: %s", input_text)
 
         TypescriptNavToCommand.reset()
         TypescriptNavToCommand.input_text = input_text
@@ -38,7 +38,7 @@ class TypescriptNavToCommand(TypeScriptBaseWindowCommand):
             self.items = items if len(items) != 0 else self.items
 
             self.window.show_quick_panel(self.format_nav_to_result(self.items), self.on_done)
-            logger.log.debug("end running nav_to with text: %s" % input_text)
+            logger.log.debug("end running nav_to with text: %s", input_text)
 
     def on_done(self, index):
         TypescriptNavToCommand.reset()
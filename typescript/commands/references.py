@@ -212,7 +212,7 @@ def get_lines_from_file(fileName, entries):
             count = count + 1
 
     except Exception as e:
-        log.exception('Error fetching preview from %s' % (fileName))
+        log.exception('Error fetching preview from %s', fileName)
     finally:
         if f is not None:
             f.close()
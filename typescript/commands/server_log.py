@@ -0,0 +1,21 @@
+import sublime
+
+from ..libs import cli
+from ..libs.panel_manager import get_panel_manager
+from .base_command import TypeScriptBaseWindowCommand
+
+# number of stderr lines shown when the command is run without arguments
+DEFAULT_LINE_COUNT = 200
+
+
+class TypescriptShowServerLog(TypeScriptBaseWindowCommand):
+    """Shows the last stderr lines of the language server of the active file"""
+
+    def run(self, lines=DEFAULT_LINE_COUNT):
+        service = cli.get_service()
+        if not service:
+            sublime.status_message("No language server for this file")
+            return
+        panel_manager = get_panel_manager()
+        panel_manager.add_panel("serverlog")
+        panel_manager.show_panel("serverlog", service.get_stderr_lines(lines) or ["(no stderr output)"])
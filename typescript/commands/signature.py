@@ -66,7 +66,7 @@ class TypescriptSignaturePopup(sublime_plugin.TextCommand):
         return TOOLTIP_SUPPORT and is_supported_ext(self.view) and get_language_service_enabled()
 
     def run(self, edit, move=None):
-        log.debug('In run for signature popup with move: {0}'.format(move if move else 'None'))
+        log.debug('In run for signature popup with move: %s', move if move else 'None')
         if not TOOLTIP_SUPPORT:
             return
 
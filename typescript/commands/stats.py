@@ -0,0 +1,48 @@
+import sublime_plugin
+
+from ..libs import cli
+from ..libs.panel_manager import get_panel_manager
+from ..libs.request_stats import format_method_stats
+from ..listeners.completion import listener as completion_listener
+from ..listeners.quick_info_tool_tip import listen as hover_listener
+
+
+class TypescriptShowStats(sublime_plugin.WindowCommand):
+    """Shows the request statistics of every running language server"""
+
+    def run(self):
+        lines = []
+        for (root_path, binary_name), stats in sorted(cli.client_manager.get_stats().items(),
+                                                      key=lambda item: str(item[0])):
+            startup = stats["startup_seconds"]
+            lines.append("{0} for {1}: started in {2}, {3:.1f} MB resident".format(
+                binary_name,
+                root_path or "all roots",
+                "{0:.2f}s".format(startup) if startup is not None else "(starting)",
+                stats["memory_bytes"] / (1024.0 * 1024.0)))
+            lines.extend(format_method_stats(stats["methods"]))
+            lines.append("cancelled: {0}".format(stats["cancelled"]))
+            lines.append("answered locally as unsupported by the server: {0}".format(stats["short_circuited"]))
+            lines.append("hover cache: {hits} hit(s), {misses} miss(es), {entries} entries".format(**stats["hover_cache"]))
+            lines.append("sync: {0}".format(stats["sync"]))
+            lines.append("")
+        if not lines:
+            lines = ["No language server running", ""]
+        lines.append("clients evicted: {evictions}, restarted: {restarts}".format(**cli.client_manager.get_lifecycle_counts()))
+        popups = completion_listener.popup_stats.snapshot()
+        cache = completion_listener.completion_cache
+        lines.append("completion popups: {0}, {1:.0f} of {2:.0f} item(s) shown, prepared in {3:.2f} ms on average".format(
+            popups["popups"], popups["mean_shown"], popups["mean_received"], popups["mean_prepare_ms"]))
+        lines.append("completion cache: {0} hit(s), {1} miss(es)".format(cache.hits, cache.misses))
+        lines.append("completion prefetches: {0}, {1} used".format(
+            completion_listener.prefetch_count, completion_listener.prefetch_used))
+        lines.append("completion requests over budget: {0} answered from local identifiers first".format(
+            completion_listener.local_fallbacks))
+        hovers = hover_listener.get_stats()
+        lines.append("hovers: {0}, {1} quick info request(s) sent, {2} saved ({3:.0%}), "
+                     "{4} cancelled, {5} stale answer(s) not shown".format(
+                         hovers["hovers"], hovers["requests"], hovers["saved"], hovers["saved_ratio"],
+                         hovers["cancelled"], hovers["stale"]))
+        panel_manager = get_panel_manager()
+        panel_manager.add_panel("stats")
+        panel_manager.show_panel("stats", lines)
@@ -0,0 +1,46 @@
+import sublime
+import sublime_plugin
+import threading
+
+from ..libs import log
+from ..libs.panel_manager import get_panel_manager
+from ..libs.request_stats import format_method_stats
+from ..libs.trace_replayer import replay_trace
+
+
+class TypescriptReplayTrace(sublime_plugin.WindowCommand):
+    """
+    Replays a recorded LSP trace through the client without a server and
+    shows the statistics of the replay
+    """
+
+    def run(self, path=None, realtime=False):
+        if path:
+            self.start(path, realtime)
+            return
+        settings = sublime.load_settings("SublimeLsp.sublime-settings")
+        directory = settings.get("trace_directory") or ""
+        self.window.show_input_panel(
+            "LSP trace to replay:", directory, lambda path: self.start(path, realtime), None, None)
+
+    def start(self, path, realtime):
+        thread = threading.Thread(target=self.replay, args=(path, realtime))
+        thread.daemon = True
+        thread.start()
+
+    def replay(self, path, realtime):
+        try:
+            stats = replay_trace(path, realtime)
+            methods = stats.pop("methods")
+            lines = ["{0}: {1}".format(key, stats[key]) for key in sorted(stats)]
+            lines.append("")
+            lines.extend(format_method_stats(methods))
+        except (IOError, OSError, ValueError) as err:
+            log.error('Can not replay %s: %s', path, err)
+            lines = ["Can not replay {0}: {1}".format(path, err)]
+        sublime.set_timeout(lambda: self.show(lines), 0)
+
+    def show(self, lines):
+        panel_manager = get_panel_manager()
+        panel_manager.add_panel("tracereplay")
+        panel_manager.show_panel("tracereplay", lines)
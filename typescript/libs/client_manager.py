@@ -1,14 +1,34 @@
-from .lsp_client import ServerClient, WorkerClient
+from .lsp_client import ServerClient, WorkerClient, HEALTH_OK
 from .service_proxy import ServiceProxy
 from .logger import log
 
 import json
+import logging
+import os
 import threading
+import time
 try:
     from Queue import Queue
 except ImportError:
     from queue import Queue  # python 3.x
 
+# directories that are not searched for source files when prewarming
+PREWARM_SKIP_DIRS = ("node_modules", "vendor", "Godeps", "bower_components")
+# number of directory entries examined per folder before the search gives up
+PREWARM_SCAN_LIMIT = 20000
+# seconds between two looks for clients to evict
+EVICTION_CHECK_INTERVAL = 60
+# seconds between two writes of the statistics file by default
+STATS_DUMP_INTERVAL = 60
+# seconds between two health checks of the running servers
+WATCHDOG_INTERVAL = 2
+# a crashed server is restarted after RESTART_BACKOFF_BASE * 2^attempts
+# seconds, at most RESTART_BACKOFF_MAX; attempts are forgotten once a
+# restarted server has stayed healthy for RESTART_BACKOFF_RESET seconds
+RESTART_BACKOFF_BASE = 1
+RESTART_BACKOFF_MAX = 60
+RESTART_BACKOFF_RESET = 60
+
 
 class LspClientManager():
 
@@ -17,35 +37,305 @@ class LspClientManager():
         self.extension_mapping = {}
         self.response_queue = Queue()
         self.lock = threading.Lock()
+        # share one server per binary between all roots
+        self.multi_root = False
+        # key -> time of the last get_client call for that client
+        self.last_used = {}
+        # key -> evicted ServiceProxy, whose documents and event handlers
+        # carry over to the client respawned for the key
+        self.evicted = {}
+        # seconds without use after which a client is shut down, 0 to never
+        self.idle_ttl = 0
+        # total resident MB above which the least recently used clients are
+        # shut down, 0 for no limit
+        self.memory_budget_mb = 0
+        self.eviction_count = 0
+        self.eviction_timer = None
+        # key -> root path the client was spawned in
+        self.root_paths = {}
+        # seconds a server may leave requests unanswered before it is
+        # restarted, 0 to only restart servers that exited
+        self.hang_timeout = 60
+        # key -> (restart attempts, time of the last restart)
+        self.restarts = {}
+        # key -> time at which a crashed client is due for restart
+        self.scheduled_restarts = {}
+        self.restart_count = 0
+        self.watchdog_timer = None
+        # file the statistics are written to periodically, None to not write them
+        self.stats_dump_path = None
+        self.stats_dump_interval = STATS_DUMP_INTERVAL
+        self.stats_timer = None
+        # set once the plugin unloads; the timers no longer reschedule
+        self.stopped = False
 
     def register_extensions(self, file_exts, binary_name, args, env):
         for file_ext in file_exts:
-            log.debug('Registered binary {0} for extension {1}'.format(binary_name, file_ext))
+            log.debug('Registered binary %s for extension %s', binary_name, file_ext)
             self.extension_mapping[file_ext] = (binary_name, args if args else [], env)
 
     def get_client(self, file_ext, root_path):
-        log.debug('Looking for client for extension {0} in {1}'.format(file_ext, root_path))
+        log.debug('Looking for client for extension %s in %s', file_ext, root_path)
         if file_ext not in self.extension_mapping:
-            log.debug('Extension {0} is not supported yet'.format(file_ext))
+            log.debug('Extension %s is not supported yet', file_ext)
             return None
             # return FileExtensionNotRegistered(file_ext)
         binary_name, args, env = self.extension_mapping[file_ext]
-        key = (root_path, binary_name)
-        if key in self.client_mapping:
-            log.debug('Using existing client')
-            return self.client_mapping[key]
+        # a multi-root server is keyed by binary alone and told about each root
+        key = (None if self.multi_root else root_path, binary_name)
+        # the prewarm thread and the UI thread may ask for the same client
+        with self.lock:
+            self.last_used[key] = time.time()
+            if key in self.client_mapping:
+                log.debug('Using existing client')
+                service = self.client_mapping[key]
+                if self.multi_root and root_path:
+                    service.add_workspace_folder(root_path)
+                return service
+            log.debug('Instantiating new client using binary %s for extension %s in %s', binary_name, file_ext, root_path)
+            workspace_folders = [root_path] if self.multi_root and root_path else None
+            service = self.__spawn(key, root_path, args, env, workspace_folders)
+            if service is None:
+                return None
+            evicted_service = self.evicted.pop(key, None)
+
+        if evicted_service:
+            log.info('Respawned evicted client %s for %s', binary_name, root_path)
+            service.adopt_event_handlers(evicted_service)
+            service.replay_documents(evicted_service.documents)
+        return service
+
+    def __spawn(self, key, root_path, args, env, workspace_folders, stderr_buffer=None):
+        """Starts the client for <key>; the caller holds the lock"""
+        binary_name = key[1]
         try:
-            log.debug('Instantiating new client using binary {0} for extension {1} in {2}'.format(binary_name, file_ext, root_path))
-            node_client = ServerClient(binary_name, args, env, root_path)
-            worker_client = WorkerClient(binary_name, args, env, root_path)
+            node_client = ServerClient(binary_name, args, env, root_path, workspace_folders, stderr_buffer)
+            worker_client = WorkerClient(binary_name, args, env, root_path, workspace_folders)
             service = ServiceProxy(worker_client, node_client)
-            self.client_mapping[key] = service
-            return service
         except Exception as err:
             # Deal with process init failure
+            log.error('Could not start %s: %s', binary_name, err)
             return None
             # return ProcessFailsToStart(
             #     file_ext, binary_name, args, env)
+        self.client_mapping[key] = service
+        self.root_paths[key] = root_path
+        return service
+
+    def start_watchdog(self):
+        """Checks the health of the servers every WATCHDOG_INTERVAL seconds"""
+        if self.watchdog_timer or self.stopped:
+            return
+        self.watchdog_timer = threading.Timer(WATCHDOG_INTERVAL, self.__on_watchdog_timer)
+        self.watchdog_timer.daemon = True
+        self.watchdog_timer.start()
+
+    def __on_watchdog_timer(self):
+        self.watchdog_timer = None
+        try:
+            self.check_health()
+        except:
+            log.exception('An error occurred while checking the servers')
+        self.start_watchdog()
+
+    def stop(self):
+        """Cancels the watchdog, eviction and statistics timers for good"""
+        self.stopped = True
+        for timer in (self.watchdog_timer, self.eviction_timer, self.stats_timer):
+            if timer:
+                timer.cancel()
+        self.watchdog_timer = self.eviction_timer = self.stats_timer = None
+
+    def check_health(self):
+        """
+        Stops servers that exited or hung, failing their pending requests,
+        and restarts them with exponential backoff
+        """
+        now = time.time()
+        with self.lock:
+            services = list(self.client_mapping.items())
+        for key, service in services:
+            if key in self.scheduled_restarts:
+                if now >= self.scheduled_restarts[key]:
+                    self.restart(key)
+                continue
+            health = service.check_health(self.hang_timeout)
+            attempts, restart_time = self.restarts.get(key, (0, 0))
+            if health == HEALTH_OK:
+                if attempts and now - restart_time > RESTART_BACKOFF_RESET:
+                    del self.restarts[key]
+                continue
+            delay = min(RESTART_BACKOFF_BASE * 2 ** attempts, RESTART_BACKOFF_MAX)
+            root_path, binary_name = key
+            log.warning('%s for %s %s; restarting in %ss',
+                        binary_name, root_path or "all roots", health, delay)
+            service.kill()
+            self.scheduled_restarts[key] = now + delay
+
+    def restart(self, key):
+        """Replaces a stopped client with a new one and reopens its documents"""
+        root_path, binary_name = key
+        with self.lock:
+            self.scheduled_restarts.pop(key, None)
+            old_service = self.client_mapping.get(key)
+            if old_service is None:
+                # evicted in the meantime
+                return
+            attempts = self.restarts.get(key, (0, 0))[0] + 1
+            self.restarts[key] = (attempts, time.time())
+            self.restart_count += 1
+            args, env = self.__get_binary_settings(binary_name)
+            service = self.__spawn(key, self.root_paths.get(key), args, env,
+                                   old_service.get_workspace_folders() or None,
+                                   old_service.get_stderr_buffer())
+            if service is None:
+                self.scheduled_restarts[key] = time.time() + min(
+                    RESTART_BACKOFF_BASE * 2 ** attempts, RESTART_BACKOFF_MAX)
+                return
+        log.info('Restarted %s for %s (attempt %s)', binary_name, root_path or "all roots", attempts)
+        service.adopt_event_handlers(old_service)
+        service.replay_documents(old_service.documents)
+
+    def __get_binary_settings(self, binary_name):
+        for name, args, env in self.extension_mapping.values():
+            if name == binary_name:
+                return args, env
+        return [], None
+
+    def prewarm(self, folders):
+        """
+        Starts, in the background, a client for every registered binary
+        whose file extensions occur in <folders>
+        """
+        thread = threading.Thread(target=self.__prewarm, args=(list(folders),))
+        thread.daemon = True
+        thread.start()
+
+    def __prewarm(self, folders):
+        for folder in folders:
+            # one extension per binary is enough to find its client
+            binaries = {}
+            for file_ext in find_extensions(folder, list(self.extension_mapping.keys())):
+                binaries.setdefault(self.extension_mapping[file_ext][0], file_ext)
+            for binary_name, file_ext in binaries.items():
+                log.info('Prewarming %s for %s', binary_name, folder)
+                self.get_client(file_ext, folder)
+        self.log_memory_usage()
+
+    def start_eviction_timer(self):
+        """Checks for clients to evict every EVICTION_CHECK_INTERVAL seconds"""
+        if self.eviction_timer or self.stopped or not (self.idle_ttl > 0 or self.memory_budget_mb > 0):
+            return
+        self.eviction_timer = threading.Timer(EVICTION_CHECK_INTERVAL, self.__on_eviction_timer)
+        self.eviction_timer.daemon = True
+        self.eviction_timer.start()
+
+    def __on_eviction_timer(self):
+        self.eviction_timer = None
+        try:
+            self.evict_idle()
+        except:
+            log.exception('An error occurred while evicting clients')
+        self.start_eviction_timer()
+
+    def evict_idle(self):
+        """
+        Shuts down the clients unused for longer than idle_ttl, then the
+        least recently used ones while the total resident memory exceeds
+        memory_budget_mb. The most recently used client is always kept.
+        """
+        now = time.time()
+        with self.lock:
+            # least recently used first
+            keys = sorted(self.client_mapping, key=lambda key: self.last_used.get(key, 0))[:-1]
+        victims = []
+        if self.idle_ttl > 0:
+            victims = [key for key in keys if now - self.last_used.get(key, 0) > self.idle_ttl]
+        if self.memory_budget_mb > 0:
+            usage = self.get_memory_usage()
+            total = sum(rss for key, rss in usage.items() if key not in victims)
+            for key in keys:
+                if total <= self.memory_budget_mb * 1024 * 1024:
+                    break
+                if key not in victims:
+                    victims.append(key)
+                    total -= usage.get(key, 0)
+        for key in victims:
+            self.evict(key)
+        if victims:
+            self.log_memory_usage()
+
+    def evict(self, key):
+        """Shuts down a client; it is respawned with its documents on next use"""
+        with self.lock:
+            service = self.client_mapping.pop(key, None)
+            if service is None:
+                return
+            self.last_used.pop(key, None)
+            self.scheduled_restarts.pop(key, None)
+            self.evicted[key] = service
+            self.eviction_count += 1
+        root_path, binary_name = key
+        log.info('Evicting client %s for %s', binary_name, root_path or "all roots")
+        service.exit()
+
+    def get_stats(self):
+        """Statistics of every client, see ServiceProxy.get_stats"""
+        with self.lock:
+            services = list(self.client_mapping.items())
+        return dict((key, service.get_stats()) for key, service in services)
+
+    def get_lifecycle_counts(self):
+        """How often clients were shut down for idleness or memory, and restarted after crashes or hangs"""
+        with self.lock:
+            return {"evictions": self.eviction_count, "restarts": self.restart_count}
+
+    def start_stats_dump(self):
+        """Writes the statistics to stats_dump_path every stats_dump_interval seconds"""
+        if self.stats_timer or self.stopped or not self.stats_dump_path:
+            return
+        self.stats_timer = threading.Timer(self.stats_dump_interval, self.__on_stats_timer)
+        self.stats_timer.daemon = True
+        self.stats_timer.start()
+
+    def __on_stats_timer(self):
+        self.stats_timer = None
+        try:
+            self.dump_stats(self.stats_dump_path)
+        except (IOError, OSError, TypeError, ValueError) as err:
+            log.error('Can not write statistics to %s: %s', self.stats_dump_path, err)
+        self.start_stats_dump()
+
+    def dump_stats(self, path):
+        stats = dict(("{0} {1}".format(binary_name, root_path or "*"), client_stats)
+                     for (root_path, binary_name), client_stats in self.get_stats().items())
+        # write the whole file at once so readers never see half of it
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as stats_file:
+            json.dump({"time": time.time(), "clients": stats, "lifecycle": self.get_lifecycle_counts()},
+                      stats_file, indent=2, sort_keys=True)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+
+    def get_memory_usage(self):
+        """Resident memory in bytes of the processes of each client"""
+        with self.lock:
+            services = list(self.client_mapping.items())
+        # measuring may spawn ps per process; get_client must not wait for it
+        return dict((key, service.get_memory_usage()) for key, service in services)
+
+    def log_memory_usage(self):
+        if not log.isEnabledFor(logging.INFO):
+            # measuring memory may spawn ps for every process
+            return
+        usage = self.get_memory_usage()
+        log.info('%s client(s) in %s mode using %.1f MB',
+                 len(usage),
+                 "multi-root" if self.multi_root else "per-root",
+                 sum(usage.values()) / (1024.0 * 1024.0))
+        for (root_path, binary_name), rss in usage.items():
+            log.debug('  %s for %s: %.1f MB', binary_name, root_path or "all roots", rss / (1024.0 * 1024.0))
 
     def has_extension(self, ext):
         return self.extension_mapping.get(ext) is not None
@@ -54,6 +344,28 @@ class LspClientManager():
         return self.client_mapping.values()
 
 
+def find_extensions(folder, file_exts, limit=PREWARM_SCAN_LIMIT):
+    """
+    Returns the subset of <file_exts> used by files under <folder>; stops
+    early once all are found or after <limit> directory entries
+    """
+    wanted = set(file_exts)
+    found = set()
+    scanned = 0
+    for dir_path, dir_names, file_names in os.walk(folder):
+        # prune hidden and dependency directories in place
+        dir_names[:] = [name for name in dir_names
+                        if not name.startswith(".") and name not in PREWARM_SKIP_DIRS]
+        for name in file_names:
+            file_ext = os.path.splitext(name)[1][1:]
+            if file_ext in wanted:
+                found.add(file_ext)
+        scanned += len(dir_names) + len(file_names)
+        if found == wanted or scanned >= limit:
+            break
+    return found
+
+
 class ClientManagerError():
     pass
 
@@ -0,0 +1,133 @@
+import heapq
+import sublime
+import threading
+
+from .logger import log
+
+# completion items shown in a popup unless "completion_max_items" is set
+DEFAULT_MAX_ITEMS = 200
+
+
+def completion_anchor(view, location, prefix):
+    """
+    The key of the completions at <location> with <prefix> typed before it:
+    the file, the position the word being completed starts at, the character
+    that triggered the completion and the text of the line up to the word.
+    The key stays the same while the word grows, whatever the document
+    version is.
+    """
+    start = location - len(prefix)
+    line_start = view.line(start).begin()
+    line_text = view.substr(sublime.Region(line_start, start))
+    trigger = line_text[-1:] if line_text else ""
+    return (view.file_name(), start, trigger, line_text)
+
+
+def match_rank(name, prefix):
+    """
+    How well <name> matches the typed <prefix>, lower is better: 0 for a
+    prefix of the same case, 1 for a prefix of another case, 2 for the
+    characters of <prefix> appearing in order; None if it does not match
+    """
+    if name.startswith(prefix):
+        return 0
+    lower_name = name.lower()
+    lower_prefix = prefix.lower()
+    if lower_name.startswith(lower_prefix):
+        return 1
+    index = 0
+    for char in lower_prefix:
+        index = lower_name.find(char, index) + 1
+        if not index:
+            return None
+    return 2
+
+
+def rank_completions(entries, prefix, limit):
+    """
+    The best <limit> legacy completion <entries> for <prefix>, ranked by
+    match_rank and then by the sort text of the server
+    """
+    ranked = []
+    for entry in entries:
+        rank = match_rank(entry["filterText"], prefix)
+        if rank is not None:
+            ranked.append((rank, entry["sortText"], entry["name"], entry))
+    # only the shown entries are sorted, lists can have thousands of them
+    return [item[-1] for item in heapq.nsmallest(limit, ranked, key=lambda item: item[:3])]
+
+
+class CompletionCache(object):
+    """
+    The last complete completion list received from the server, refiltered
+    locally while the user keeps typing the same word
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.anchor = None
+        self.prefix = None
+        # legacy completion entries, see lsp_helpers.convert_completion_item
+        self.entries = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, anchor, prefix):
+        """
+        The cached entries for <prefix> at <anchor>, or None if the server has
+        to be asked; the caller ranks and filters them
+        """
+        with self.lock:
+            if self.entries is None or anchor != self.anchor or not prefix.startswith(self.prefix):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self.entries
+
+    def put(self, anchor, prefix, entries, incomplete=False):
+        """
+        Caches the <entries> received for <prefix> at <anchor>; an incomplete
+        list is never reused
+        """
+        with self.lock:
+            if incomplete:
+                self.__clear()
+                return
+            self.anchor = anchor
+            self.prefix = prefix
+            self.entries = list(entries)
+
+    def clear(self):
+        with self.lock:
+            self.__clear()
+
+    def __clear(self):
+        self.anchor = None
+        self.prefix = None
+        self.entries = None
+
+
+class PopupStats(object):
+    """Size and preparation time of the completion lists shown"""
+
+    def __init__(self):
+        self.popups = 0
+        self.received = 0
+        self.shown = 0
+        self.prepare_time = 0.0
+
+    def record(self, received, shown, seconds):
+        self.popups += 1
+        self.received += received
+        self.shown += shown
+        self.prepare_time += seconds
+        log.debug('Completion popup: %s of %s item(s) prepared in %.2f ms', shown, received, seconds * 1000)
+
+    def snapshot(self):
+        popups = self.popups or 1
+        return {
+            "popups": self.popups,
+            "mean_received": float(self.received) / popups,
+            "mean_shown": float(self.shown) / popups,
+            "mean_prepare_ms": self.prepare_time * 1000 / popups
+        }
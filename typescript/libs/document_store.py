@@ -0,0 +1,231 @@
+import re
+import threading
+
+# TextDocumentSyncKind values of the LSP specification
+SYNC_NONE = 0
+SYNC_FULL = 1
+SYNC_INCREMENTAL = 2
+
+# Number of characters compared at once while looking for the changed span
+_DIFF_BLOCK_SIZE = 4096
+
+# Characters outside the Basic Multilingual Plane, two UTF-16 code units each
+_ASTRAL_PATTERN = re.compile("[\U00010000-\U0010ffff]")
+
+
+class Document(object):
+    """The text and version of a document as last sent to the server"""
+
+    def __init__(self, path, text, version=0):
+        self.path = path
+        self.text = text
+        self.version = version
+
+
+class PendingChange(object):
+    """Modifications of a document that have not been sent yet"""
+
+    def __init__(self, path, get_text):
+        self.path = path
+        # Returns the current buffer content when the change is flushed
+        self.get_text = get_text
+        self.edits = None
+        # Ids (view change counts) of the modifications folded in
+        self.change_ids = set()
+
+    def depth(self):
+        return max(len(self.change_ids), 1)
+
+
+class DocumentStore(object):
+    """
+    Tracks the documents open on a server and turns new buffer contents into
+    versioned LSP content changes.
+
+    Edits are (begin, end, new_text) tuples of character offsets into the
+    last-sent text. Callers holding the lock can compute and send changes
+    atomically, so versions reach the server in order.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.documents = {}
+        # path -> PendingChange, coalesced until the next flush
+        self.pending_changes = {}
+        self.flush_count = 0
+        self.coalesced_count = 0
+
+    def open(self, path, text, version=0):
+        with self.lock:
+            document = Document(path, text, version)
+            self.documents[path] = document
+            return document
+
+    def close(self, path):
+        with self.lock:
+            self.pending_changes.pop(path, None)
+            return self.documents.pop(path, None)
+
+    def get(self, path):
+        with self.lock:
+            return self.documents.get(path)
+
+    def is_open(self, path):
+        with self.lock:
+            return path in self.documents
+
+    def snapshot(self):
+        """Copies of the open documents"""
+        with self.lock:
+            return [Document(document.path, document.text, document.version)
+                    for document in self.documents.values()]
+
+    def queue_change(self, path, get_text, edits=None, change_id=None):
+        """
+        Records a modification of <path> to be sent later. Edits are kept
+        only while the queue holds a single modification.
+
+        Returns True if this is the first modification since the last flush.
+        """
+        with self.lock:
+            pending = self.pending_changes.get(path)
+            first = pending is None
+            if first:
+                pending = PendingChange(path, get_text)
+                self.pending_changes[path] = pending
+            pending.get_text = get_text
+            pending.change_ids.add(change_id)
+            if len(pending.change_ids) == 1:
+                pending.edits = edits or pending.edits
+            else:
+                pending.edits = None
+            return first
+
+    def take_pending(self, path=None):
+        """Removes and returns the pending changes of <path>, or of every document"""
+        with self.lock:
+            if path is None:
+                taken = list(self.pending_changes.values())
+                self.pending_changes.clear()
+            else:
+                pending = self.pending_changes.pop(path, None)
+                taken = [pending] if pending else []
+            for pending in taken:
+                self.flush_count += 1
+                self.coalesced_count += pending.depth() - 1
+            return taken
+
+    def get_sync_stats(self):
+        with self.lock:
+            return {
+                "queued_documents": len(self.pending_changes),
+                "queue_depth": sum(pending.depth() for pending in self.pending_changes.values()),
+                "flushes": self.flush_count,
+                "coalesced_modifications": self.coalesced_count
+            }
+
+    def update(self, path, text, edits=None, sync_kind=SYNC_INCREMENTAL):
+        """
+        Records <text> as the new content of the document and returns the
+        content changes bringing the server up to date, or None if nothing
+        changed. The version is bumped for every non-empty update.
+
+        <edits> are used when they turn the last-sent text into <text>;
+        otherwise the changed span is found by diffing the two texts.
+        """
+        with self.lock:
+            document = self.documents[path]
+            old_text = document.text
+            if text == old_text:
+                return None
+
+            changes = None
+            if edits:
+                changes = changes_from_edits(old_text, text, edits)
+            if changes is None:
+                changes = [change_from_diff(old_text, text)]
+
+            document.text = text
+            document.version += 1
+            if sync_kind == SYNC_FULL:
+                return [{"text": text}]
+            return changes
+
+
+def changes_from_edits(old_text, new_text, edits):
+    """
+    Returns the content changes for <edits> if applying them to <old_text>
+    produces <new_text>, otherwise None
+    """
+    changes = []
+    text = old_text
+    # Apply from the end of the buffer so earlier offsets stay valid
+    for begin, end, insert_string in sorted(edits, key=lambda edit: edit[0], reverse=True):
+        if begin < 0 or end > len(text) or begin > end:
+            return None
+        changes.append({
+            "range": offsets_to_range(text, begin, end),
+            "text": insert_string
+        })
+        text = text[:begin] + insert_string + text[end:]
+    if text != new_text:
+        return None
+    return changes
+
+
+def change_from_diff(old_text, new_text):
+    """Returns a single content change replacing the span that differs"""
+    prefix = common_prefix_length(old_text, new_text)
+    suffix = common_suffix_length(old_text, new_text, prefix)
+    return {
+        "range": offsets_to_range(old_text, prefix, len(old_text) - suffix),
+        "text": new_text[prefix:len(new_text) - suffix]
+    }
+
+
+def common_prefix_length(a, b):
+    limit = min(len(a), len(b))
+    start = 0
+    # Skip equal blocks at C speed, then find the first difference
+    while start < limit and a[start:start + _DIFF_BLOCK_SIZE] == b[start:start + _DIFF_BLOCK_SIZE]:
+        start += _DIFF_BLOCK_SIZE
+    end = min(start + _DIFF_BLOCK_SIZE, limit)
+    while start < end and a[start] == b[start]:
+        start += 1
+    return min(start, limit)
+
+
+def common_suffix_length(a, b, prefix=0):
+    """Length of the common suffix that does not overlap a common prefix"""
+    limit = min(len(a), len(b)) - prefix
+    length = 0
+    while length < limit:
+        size = min(_DIFF_BLOCK_SIZE, limit - length)
+        if a[len(a) - length - size:len(a) - length] != b[len(b) - length - size:len(b) - length]:
+            break
+        length += size
+    end = min(length + _DIFF_BLOCK_SIZE, limit)
+    while length < end and a[len(a) - length - 1] == b[len(b) - length - 1]:
+        length += 1
+    return length
+
+
+def offset_to_position(text, offset):
+    """
+    Converts a character offset into a zero-based LSP position, whose
+    character is counted in UTF-16 code units
+    """
+    line = text.count("\n", 0, offset)
+    line_start = text.rfind("\n", 0, offset) + 1
+    astral = len(_ASTRAL_PATTERN.findall(text, line_start, offset))
+    return {
+        "line": line,
+        "character": offset - line_start + astral
+    }
+
+
+def offsets_to_range(text, begin, end):
+    return {
+        "start": offset_to_position(text, begin),
+        "end": offset_to_position(text, end)
+    }
@@ -5,6 +5,7 @@ from .client_manager import LspClientManager
 from .service_proxy import ServiceProxy
 from .global_vars import *
 from . import global_vars
+from . import logger
 import copy
 
 class ClientFileInfo:
@@ -43,9 +44,6 @@ class EditorClient:
     def __init__(self):
         self.file_map = {}
         self.ref_info = None
-        self.seq_to_tempfile_name = {}
-        self.available_tempfile_list = []
-        self.tmpseq = 0
         # self.node_client = None
         # self.worker_client = None
         self.initialized = False
@@ -57,6 +55,8 @@ class EditorClient:
         self.ts_auto_indent_enabled = True
         self.auto_match_enabled = True
         self.client_manager = LspClientManager()
+        # window folders whose servers have been started ahead of use
+        self.prewarmed_folders = set()
 
     def go_specific_hack(self, env):
         gopaths = env["GOPATH"].split(os.pathsep)
@@ -65,6 +65,12 @@ class EditorClient:
 
     def initialize_client_manager(self, settings):
         # initialize client manager
+        self.client_manager.multi_root = settings.get("multi_root", False)
+        self.client_manager.idle_ttl = settings.get("server_idle_ttl", 0)
+        self.client_manager.memory_budget_mb = settings.get("server_memory_budget_mb", 0)
+        self.client_manager.hang_timeout = settings.get("server_hang_timeout", 60)
+        self.client_manager.stats_dump_path = settings.get("stats_dump_path") or None
+        self.client_manager.stats_dump_interval = settings.get("stats_dump_interval", 60)
         clients = settings.get("clients")
         if clients:
             for client in clients:
@@ -82,8 +88,23 @@ class EditorClient:
                     client["binary"],
                     client.get("args"), 
                     env)
+        self.client_manager.start_eviction_timer()
+        self.client_manager.start_watchdog()
+        self.client_manager.start_stats_dump()
 
 
+    def prewarm_window(self, window):
+        """Starts the servers for the folders of <window> if prewarming is enabled"""
+        if window is None or not self.initialized:
+            return
+        settings = sublime.load_settings("SublimeLsp.sublime-settings")
+        if not settings.get("prewarm_servers", False):
+            return
+        folders = [folder for folder in window.folders() if folder not in self.prewarmed_folders]
+        if folders:
+            self.prewarmed_folders.update(folders)
+            self.client_manager.prewarm(folders)
+
     def get_service(self):
         file_ext = sublime.active_window().extract_variables().get('file_extension')
         root_path = get_root_path()
@@ -99,6 +120,8 @@ class EditorClient:
         # retrieve the path to tsserver.js
         # first see if user set the path to the file
         settings = sublime.load_settings("SublimeLsp.sublime-settings")
+        settings.add_on_change("log_level", self.load_log_level)
+        self.load_log_level()
         self.initialize_client_manager(settings)
         # tsdk_location = settings.get("typescript_tsdk")
         # if tsdk_location:
@@ -129,6 +152,10 @@ class EditorClient:
 
         self.initialized = True
 
+    def load_log_level(self):
+        settings = sublime.load_settings('SublimeLsp.sublime-settings')
+        logger.set_level(settings.get("log_level", "warning"))
+
     def load_format_settings(self):
         settings = sublime.load_settings('SublimeLsp.sublime-settings')
         self.tab_size = settings.get('tab_size', 4)
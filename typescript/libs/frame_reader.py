@@ -0,0 +1,130 @@
+"""
+Splits the byte stream of a language server into Content-Length framed
+messages.
+
+The reader pulls large chunks from the pipe into one reusable bytearray and
+hands out every complete frame found in a chunk as a memoryview slice of that
+buffer, so a burst of notifications costs one system call and no intermediate
+copies of the message bodies.
+"""
+
+from .logger import log
+
+# Size of a single read from the pipe, and the initial size of the buffer
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_HEADER_TERMINATOR = b"\r\n\r\n"
+_CONTENT_LENGTH_HEADER = b"content-length"
+# The header block nearly every server sends, parsed without splitting it
+_CONTENT_LENGTH_PREFIX = b"Content-Length: "
+
+
+def parse_content_length(header):
+    """Returns the Content-Length value of a header block, or 0 if absent"""
+    if header.startswith(_CONTENT_LENGTH_PREFIX):
+        try:
+            return int(header[len(_CONTENT_LENGTH_PREFIX):])
+        except ValueError:
+            # more headers follow
+            pass
+    for line in header.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == _CONTENT_LENGTH_HEADER:
+            return int(value.strip())
+    log.info('Frame header without Content-Length: %r', header)
+    return 0
+
+
+class FrameReader(object):
+    """Reads Content-Length framed messages from a stream in large chunks
+
+    Usage from the reader thread:
+
+        reader = FrameReader(proc.stdout)
+        while reader.fill():
+            for body in reader.frames():
+                dispatch(str(body, "utf-8"))
+
+    A body yielded by frames() is only valid until the generator is resumed;
+    it must be decoded (or copied) before asking for the next frame.
+    """
+
+    def __init__(self, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Read from the unbuffered layer so that a read returns whatever is
+        # available in the pipe instead of blocking until the buffer is full
+        self.stream = getattr(stream, "raw", stream)
+        self.chunk_size = chunk_size
+        self.buffer = bytearray(chunk_size)
+        # Unconsumed data lives in buffer[start:end]
+        self.start = 0
+        self.end = 0
+        # Body length of the frame whose header has been parsed, or -1
+        self.body_length = -1
+
+        self.bytes_read = 0
+        self.reads = 0
+        self.frames_read = 0
+
+    def fill(self):
+        """Reads the next chunk from the stream
+
+        Returns False once the stream is closed.
+        """
+        self._make_room()
+        with memoryview(self.buffer) as view:
+            free = view[self.end:]
+            count = self.stream.readinto(free)
+            free.release()
+        if not count:
+            return False
+        self.end += count
+        self.bytes_read += count
+        self.reads += 1
+        return True
+
+    def frames(self):
+        """Yields the body of every complete frame currently buffered"""
+        buffer = self.buffer
+        # The position and pending length live in locals while scanning a
+        # chunk and are stored back before every yield and return
+        start, end, body_length = self.start, self.end, self.body_length
+        with memoryview(buffer) as view:
+            while True:
+                if body_length < 0:
+                    header_end = buffer.find(_HEADER_TERMINATOR, start, end)
+                    if header_end < 0:
+                        self.start, self.body_length = start, body_length
+                        return
+                    body_length = parse_content_length(buffer[start:header_end])
+                    start = header_end + len(_HEADER_TERMINATOR)
+
+                body_end = start + body_length
+                if body_end > end:
+                    self.start, self.body_length = start, body_length
+                    return
+                body = view[start:body_end]
+                start, body_length = body_end, -1
+                self.start, self.body_length = start, body_length
+                self.frames_read += 1
+                try:
+                    yield body
+                finally:
+                    body.release()
+
+    def _make_room(self):
+        """Moves the partial frame to the front of the buffer and grows it if needed"""
+        pending = self.end - self.start
+        if pending == 0:
+            self.start = self.end = 0
+            if len(self.buffer) > 16 * self.chunk_size:
+                # Give back the memory of an unusually large frame
+                self.buffer = bytearray(self.chunk_size)
+        elif self.start > 0:
+            self.buffer[0:pending] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, pending
+
+        # Make sure a frame with a known length fits in one piece, and that
+        # there is always room for a reasonable read
+        needed = max(self.body_length, 0) + self.chunk_size
+        if len(self.buffer) - self.end < needed // 2:
+            self.buffer.extend(bytes(needed - (len(self.buffer) - self.end)))
@@ -47,9 +47,11 @@ PHANTOM_SUPPORT = int(sublime.version()) >= 3118
 # detect if quick info is available for symbol
 SUBLIME_WORD_MASK = 515
 
-# set logging levels
-LOG_FILE_LEVEL = logging.DEBUG
-LOG_CONSOLE_LEVEL = logging.DEBUG
+# default logging level, overridden by the "log_level" setting
+LOG_LEVEL = logging.WARNING
+# size at which TS.log is rotated, and number of rotated files kept
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 2
 
 NON_BLANK_LINE_PATTERN = re.compile("[\S]+")
 VALID_COMPLETION_ID_PATTERN = re.compile("[a-zA-Z_$\.][\w$\.]*\Z")
@@ -0,0 +1,63 @@
+import collections
+import threading
+
+# hover responses kept per document
+HOVER_CACHE_SIZE = 64
+
+
+def range_contains(body, location):
+    """True if the legacy quick info <body> covers <location>, ends included"""
+    start = body.get("start")
+    end = body.get("end")
+    if not start or not end:
+        return False
+    position = (location.line, location.offset)
+    return (start["line"], start["offset"]) <= position <= (end["line"], end["offset"])
+
+
+class HoverCache(object):
+    """
+    Successful quick info responses by document version and symbol range;
+    a response answers every position within the range it covers, until the
+    document changes
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # path -> (version, deque of (location, response))
+        self.documents = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, version, location):
+        with self.lock:
+            cached = self.documents.get(path)
+            if cached and cached[0] == version:
+                for cached_location, response in cached[1]:
+                    if range_contains(response["body"], location) or \
+                            (cached_location.line, cached_location.offset) == (location.line, location.offset):
+                        self.hits += 1
+                        return response
+            self.misses += 1
+            return None
+
+    def put(self, path, version, location, response):
+        with self.lock:
+            cached = self.documents.get(path)
+            if not cached or cached[0] != version:
+                # responses for earlier versions are stale
+                cached = (version, collections.deque(maxlen=HOVER_CACHE_SIZE))
+                self.documents[path] = cached
+            cached[1].appendleft((location, response))
+
+    def invalidate(self, path):
+        with self.lock:
+            self.documents.pop(path, None)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": sum(len(cached[1]) for cached in self.documents.values())
+            }
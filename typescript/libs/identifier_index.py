@@ -0,0 +1,75 @@
+import heapq
+import re
+import sublime
+import threading
+
+from .logger import log
+from .completion_cache import match_rank
+
+IDENTIFIER_PATTERN = re.compile(r"[^\W\d]\w*", re.UNICODE)
+# milliseconds without modifications before a document is indexed again
+REINDEX_DELAY = 500
+
+# Sublime Text 2 has no worker thread; index on the UI thread there
+_set_timeout_async = getattr(sublime, "set_timeout_async", sublime.set_timeout)
+
+
+class IdentifierIndex(object):
+    """
+    The identifiers of the open documents, offered as completions while the
+    server is slow to answer. Documents are indexed one at a time on the
+    worker thread, once their modifications pause.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # path -> frozenset of the identifiers in the document
+        self.documents = {}
+        # path -> change count the next indexing of the document is for
+        self.scheduled = {}
+
+    def schedule(self, view, change_count):
+        """Indexes the document of <view> unless it changes again within REINDEX_DELAY"""
+        path = view.file_name()
+        if not path:
+            return
+        with self.lock:
+            self.scheduled[path] = change_count
+        _set_timeout_async(lambda: self.__index(view, path, change_count), REINDEX_DELAY)
+
+    def __index(self, view, path, change_count):
+        with self.lock:
+            if self.scheduled.get(path) != change_count:
+                # a later modification scheduled its own indexing
+                return
+            del self.scheduled[path]
+        if not view.is_valid():
+            return
+        self.update(path, view.substr(sublime.Region(0, view.size())))
+
+    def update(self, path, text):
+        identifiers = frozenset(IDENTIFIER_PATTERN.findall(text))
+        with self.lock:
+            self.documents[path] = identifiers
+        log.debug('Indexed %s identifier(s) of %s', len(identifiers), path)
+
+    def remove(self, path):
+        with self.lock:
+            self.documents.pop(path, None)
+            self.scheduled.pop(path, None)
+
+    def candidates(self, prefix, limit):
+        """The <limit> identifiers that best match <prefix>, shortest first among equals"""
+        with self.lock:
+            documents = list(self.documents.values())
+        seen = set()
+        ranked = []
+        for identifiers in documents:
+            for name in identifiers:
+                if name in seen or name == prefix:
+                    continue
+                seen.add(name)
+                rank = match_rank(name, prefix)
+                if rank is not None:
+                    ranked.append((rank, len(name), name))
+        return [name for rank, length, name in heapq.nsmallest(limit, ranked)]
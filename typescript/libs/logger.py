@@ -6,43 +6,92 @@ object to send messages to the stderr (which appear in the console in Sublime).
 
 A log file is also created in the plugin folder for messages at the level set
 by the properties below.
+
+Records are handed to a background thread through a queue, so the calling
+thread never formats or writes them. Pass arguments separately, as in
+log.debug('Sending %s', cmd), so that nothing is formatted unless the level
+is enabled. The level can be changed at runtime with the "log_level" setting.
 """
 
 import logging
+import logging.handlers
 from os import path
-from .global_vars import LOG_CONSOLE_LEVEL, LOG_FILE_LEVEL
+from .global_vars import LOG_LEVEL, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT
+
+# queue module name changed from Python 2 to 3
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 # The default path to the log file created for diagnostic output
 _pluginRoot = path.dirname(path.dirname(path.abspath(__file__)))
 filePath = path.join(_pluginRoot, 'TS.log')
 
 log = logging.getLogger('TS')
-log.setLevel(logging.DEBUG)
+log.setLevel(LOG_LEVEL)
+log.propagate = False
 
 _logFormat = logging.Formatter('%(asctime)s: %(thread)d: %(levelname)s: %(message)s')
 
-logFile = logging.FileHandler(filePath, mode='w')
-logFile.setLevel(logging.DEBUG)
+# the file is only opened once the first record is written
+logFile = logging.handlers.RotatingFileHandler(
+    filePath, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, delay=True)
 logFile.setFormatter(_logFormat)
-log.addHandler(logFile)
 
 console = logging.StreamHandler()
-console.setLevel(logging.DEBUG)
 console.setFormatter(_logFormat)
-log.addHandler(console)
 
-log.info('Logging configured to log to file: {0}'.format(filePath))
+# the logger outlives plugin reloads; drop the handlers of the previous load
+for _handler in list(log.handlers):
+    log.removeHandler(_handler)
+    _handler.close()
 
+if hasattr(logging.handlers, "QueueHandler"):
+    class _DeferredQueueHandler(logging.handlers.QueueHandler):
+        """Enqueues records as they are; the listener thread formats them"""
 
-def view_debug(view, message):
-    filename = view.file_name()
-    view_name = view.name()
-    name = view_name if filename is None else filename
-    log.debug(message + ": " + name)
+        def prepare(self, record):
+            return record
+
+    _queue = queue.Queue(-1)
+    log.addHandler(_DeferredQueueHandler(_queue))
+    _listener = logging.handlers.QueueListener(_queue, logFile, console)
+    _listener.start()
+else:
+    # Python 2.6 (Sublime Text 2) has no queue handlers; write synchronously
+    _listener = None
+    log.addHandler(logFile)
+    log.addHandler(console)
 
+log.info('Logging configured to log to file: %s', filePath)
 
-logFile.setLevel(LOG_FILE_LEVEL)
-console.setLevel(LOG_CONSOLE_LEVEL)
 
+def set_level(level_name):
+    """Sets the level from its name, e.g. "debug" or "warning"; unknown names are ignored"""
+    level = logging.getLevelName(str(level_name).upper())
+    if isinstance(level, int):
+        log.setLevel(level)
+    else:
+        log.warning('Unknown log level %r', level_name)
 
 
+def stop():
+    """Writes out the queued records, stops the writer thread and detaches the handlers"""
+    global _listener
+    # nothing may be queued behind the listener's stop sentinel
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    if _listener:
+        _listener.stop()
+        _listener = None
+    logFile.close()
+
+
+def view_debug(view, message):
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    filename = view.file_name()
+    view_name = view.name()
+    name = view_name if filename is None else filename
+    log.debug('%s: %s', message, name)
@@ -14,7 +14,14 @@ from . import json_helpers
 from . import global_vars
 from . import lsp_helpers
 from . import node_client
-from .os_helpers import which
+from .document_store import SYNC_NONE, SYNC_FULL
+from .frame_reader import FrameReader
+from .pending_requests import PendingRequests, RequestFuture
+from .stderr_buffer import StderrBuffer, DEFAULT_MAX_LINES, DEFAULT_CONSOLE_RATE
+from .traffic_trace import TrafficRecorder, OUTGOING, INCOMING, trace_path
+from .request_stats import RequestStats
+from .request_timeouts import RequestTimeouts, DEFAULT_FACTOR, DEFAULT_MIN_TIMEOUT, DEFAULT_MAX_TIMEOUT
+from .os_helpers import which, get_rss
 
 # queue module name changed from Python 2 to 3
 if int(sublime.version()) < 3000:
@@ -22,10 +29,33 @@ if int(sublime.version()) < 3000:
 else:
     import queue
 
+# seconds to wait for the response of sendCmd, sendCmdSync and sendCmdAsync
+# until the timeout of the method has adapted to the server, see RequestTimeouts
+SEND_CMD_TIMEOUT = 1
+SEND_CMD_SYNC_TIMEOUT = 2
+ASYNC_CMD_TIMEOUT = 30
+INITIALIZE_TIMEOUT = 60
+SHUTDOWN_TIMEOUT = 5
+# seconds a server gets to exit on its own before it is killed
+EXIT_GRACE_PERIOD = 2
+
+# startup states of a client
+STATE_STOPPED = "stopped"
+STATE_INITIALIZING = "initializing"
+STATE_READY = "ready"
+# the server could not be spawned, or answered initialize with an error
+STATE_FAILED = "failed"
+
+# results of a health check
+HEALTH_OK = "ok"
+HEALTH_EXITED = "exited"
+HEALTH_HUNG = "hung"
+HEALTH_FAILED = "failed to start"
+
+
 class LspCommClient(node_client.CommClient):
-    __CONTENT_LENGTH_HEADER = b"Content-Length: "
 
-    def __init__(self, binary_path, args, env, root_path):
+    def __init__(self, binary_path, args, env, root_path, workspace_folders=None):
         self.server_proc = None
         self.args = copy.deepcopy(args)
         program = which(binary_path, path = env["PATH"])
@@ -33,29 +63,253 @@ class LspCommClient(node_client.CommClient):
             program = binary_path
         self.args.insert(0, program)
         self.root_path = root_path
+        # folders announced to a server shared by several roots, empty otherwise
+        self.workspace_folders = list(workspace_folders or [])
         self.env = copy.deepcopy(env)
 
         # create event handler maps
         self.event_handlers = dict()
 
-        # create response and event queues
-        self.msgq = queue.Queue()
+        # create the event queue and the table of requests awaiting a response
         self.eventq = queue.Queue()
-        self.asyncReq = {}
+        self.pending = PendingRequests()
+        # serializes frames written from different threads
+        self.write_lock = threading.Lock()
+        # writes the traffic to a trace file once started
+        self.recorder = TrafficRecorder()
+        self.stats = RequestStats()
+        settings = sublime.load_settings("SublimeLsp.sublime-settings")
+        self.timeouts = RequestTimeouts(
+            self.stats,
+            settings.get("request_timeouts"),
+            settings.get("request_timeout_factor", DEFAULT_FACTOR),
+            settings.get("request_timeout_min", DEFAULT_MIN_TIMEOUT),
+            settings.get("request_timeout_max", DEFAULT_MAX_TIMEOUT))
+
+        # capabilities from the initialize response, None until it arrives
+        self.capabilities = None
+        # messages held back until the initialize handshake completes
+        self.state = STATE_STOPPED
+        self.startup_queue = []
+        self.short_circuit_count = 0
+        # seconds from spawning the server to its initialize response
+        self.start_time = None
+        self.startup_time = None
 
         self.debug_proc = None
         self.breakpoints = []
 
-        self.reqType = {}
+    def initialize(self):
+        """
+        Starts the initialize handshake; any other message is queued until
+        the server has answered
+        """
+        self.state = STATE_INITIALIZING
+        self.start_time = time.time()
+        self.request(
+            lsp_helpers.init_message(self.root_path, self.server_proc.pid, self.workspace_folders),
+            INITIALIZE_TIMEOUT,
+            self.on_initialize
+        )
+
+    def on_initialize(self, response):
+        """Caches the server capabilities, then releases the queued messages"""
+        if self.state != STATE_INITIALIZING or not self.server_proc:
+            # killed or stopped while waiting for the answer
+            return
+        if not response["success"]:
+            log.error('Server failed to initialize: %s', response.get("message"))
+            with self.write_lock:
+                self.state = STATE_FAILED
+                self.startup_queue = []
+            # the watchdog restarts the server
+            LspCommClient.fail_pending(self.pending, "server failed to initialize")
+            return
+        self.startup_time = time.time() - self.start_time
+        log.info('%s for %s answered initialize in %.2fs',
+                 os.path.basename(self.args[0]), self.root_path, self.startup_time)
+        capabilities = response["body"].get("capabilities") or {}
+        log.debug('Server capabilities: %s', capabilities)
+
+        unsupported = []
+        with self.write_lock:
+            self.capabilities = capabilities
+            self.__write_frame(lsp_helpers.initialized_message())
+            queued, self.startup_queue = self.startup_queue, []
+            for lsp_cmd in queued:
+                if lsp_cmd.get("method") == "$/cancelRequest":
+                    # the cancelled request is dropped below instead
+                    continue
+                if "id" in lsp_cmd:
+                    future = self.pending.get(lsp_cmd["id"])
+                    if future is None:
+                        # cancelled or timed out while waiting
+                        continue
+                    if not self.supports(lsp_cmd["method"]):
+                        unsupported.append(future)
+                        continue
+                self.__write_frame(lsp_cmd)
+            self.state = STATE_READY
+        log.debug('Server ready; sent %s queued message(s)', len(queued) - len(unsupported))
+
+        for future in unsupported:
+            self.pending.pop(future.req_id)
+            self.__short_circuit(future)
+
+    def get_startup_time(self):
+        return self.startup_time
+
+    def get_workspace_folders(self):
+        return self.workspace_folders
+
+    def add_workspace_folder(self, path):
+        """Adds <path> to the folders served by a multi-root server"""
+        if path in self.workspace_folders:
+            return
+        self.workspace_folders.append(path)
+        if self.state != STATE_STOPPED:
+            log.debug('Adding workspace folder %s', path)
+            self.write(lsp_helpers.did_change_workspace_folders_message(added=[path]))
+
+    def shutdown(self, seq):
+        """
+        Sends shutdown, then exit once the server has answered or the
+        request timed out; the process is killed if it is still alive
+        after a grace period. Does not block.
+        """
+        proc = self.server_proc
+        if not proc:
+            return
+
+        def on_shutdown(response):
+            self.write(lsp_helpers.exit_message())
+            self.recorder.stop()
+            self.state = STATE_STOPPED
+            self.server_proc = None
+            killer = threading.Timer(EXIT_GRACE_PERIOD, LspCommClient.__kill, args=(proc,))
+            killer.daemon = True
+            killer.start()
+
+        log.debug('Shutting down server %s', proc.pid)
+        self.request(lsp_helpers.shutdown_message(seq), SHUTDOWN_TIMEOUT, on_shutdown)
+        # expire() only runs on the next request, so time the shutdown out here
+        timer = threading.Timer(SHUTDOWN_TIMEOUT + 0.1, self.expire_pending)
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def __kill(proc):
+        if proc.poll() is None:
+            log.debug('Killing server %s', proc.pid)
+            proc.kill()
+
+    def check_health(self, hang_timeout):
+        """
+        Tells whether the server process exited, or left requests unanswered
+        for more than <hang_timeout> seconds (0 to ignore hangs)
+        """
+        proc = self.server_proc
+        if self.state == STATE_FAILED:
+            return HEALTH_FAILED
+        if self.state == STATE_STOPPED or not proc:
+            return HEALTH_OK
+        if proc.poll() is not None:
+            return HEALTH_EXITED
+        if hang_timeout > 0 and self.pending.starved_for() > hang_timeout:
+            return HEALTH_HUNG
+        return HEALTH_OK
+
+    def kill(self):
+        """Stops a crashed or hung server and fails its pending requests at once"""
+        proc = self.server_proc
+        self.state = STATE_STOPPED
+        self.server_proc = None
+        if proc:
+            LspCommClient.__kill(proc)
+        self.recorder.stop()
+        LspCommClient.fail_pending(self.pending, "server stopped")
+
+    @staticmethod
+    def fail_pending(pending, message):
+        count = pending.fail_all(lambda future: lsp_helpers.failed_response(
+            future.command, {"id": future.req_id, "error": {"message": message}}))
+        if count:
+            log.debug('Failed %s pending request(s): %s', count, message)
 
-    def makeTimeoutMsg(self, cmd, seq):
-        jsonDict = json_helpers.decode(cmd)
+    def get_stats(self):
+        """
+        Per-method request statistics, see RequestStats.snapshot, with the
+        timeout currently in effect for methods that have one of their own
+        """
+        stats = self.stats.snapshot(self.pending.in_flight())
+        for method, values in stats.items():
+            timeout = self.timeouts.get(method)
+            if timeout is not None:
+                values["timeout_ms"] = timeout * 1000
+        return stats
+
+    def start_recording_if_enabled(self):
+        """Records the traffic if the "trace_directory" setting names a directory"""
+        settings = sublime.load_settings("SublimeLsp.sublime-settings")
+        directory = settings.get("trace_directory")
+        if not directory or not self.server_proc:
+            return
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.recorder.start(trace_path(directory, os.path.basename(self.args[0]), self.server_proc.pid))
+        except (IOError, OSError) as err:
+            log.error('Can not record LSP traffic to %s: %s', directory, err)
+
+    def get_rss(self):
+        """Resident memory of the server process in bytes, None if unknown"""
+        if not self.server_proc or self.server_proc.poll() is not None:
+            return None
+        return get_rss(self.server_proc.pid)
+
+    def is_ready(self):
+        return self.state == STATE_READY
+
+    def supports(self, method):
+        """False only if the server capabilities rule out <method>"""
+        return lsp_helpers.supports_method(self.capabilities, method)
+
+    def __short_circuit(self, future):
+        """Answers a request the server does not support without a round trip"""
+        self.short_circuit_count += 1
+        log.debug('Server does not support %s', future.method)
+        future.set_response(lsp_helpers.failed_response(
+            future.command,
+            {"id": future.req_id, "error": {"message": "unsupported by the server"}}
+        ))
+
+    def get_short_circuit_count(self):
+        """Number of requests answered locally because the server does not support them"""
+        return self.short_circuit_count
+
+    def get_sync_kind(self):
+        """TextDocumentSyncKind of the server; full text until it is known"""
+        if self.capabilities is None:
+            return SYNC_FULL
+        sync = self.capabilities.get("textDocumentSync", SYNC_NONE)
+        if isinstance(sync, dict):
+            return sync.get("change", SYNC_NONE)
+        return sync
+
+    def get_completion_triggers(self):
+        """Characters after which the server offers completions"""
+        provider = (self.capabilities or {}).get("completionProvider")
+        if not isinstance(provider, dict):
+            return []
+        return provider.get("triggerCharacters") or []
+
+    def makeTimeoutMsg(self, command, seq):
         timeoutMsg = {
             "seq": 0,
             "type": "response",
             "success": False,
             "request_seq": seq,
-            "command": jsonDict["method"],
+            "command": command,
             "message": "timeout"
         }
         return timeoutMsg
@@ -67,6 +321,10 @@ class LspCommClient(node_client.CommClient):
         if cb not in event_handlers[event_name]:
             event_handlers[event_name].append(cb)
 
+    def get_event_handlers(self):
+        """A copy of the registered event handlers, by event name"""
+        return dict((event_name, list(callbacks)) for event_name, callbacks in self.event_handlers.items())
+
     def started(self):
         return self.server_proc is not None
 
@@ -82,70 +340,120 @@ class LspCommClient(node_client.CommClient):
 
     def sendCmd(self, cmd, cb, seq):
         """
-        send single-line command string; no sequence number; wait for response
-        this assumes stdin/stdout; for TCP, need to add correlation with sequence numbers
+        Sends the command, waits for its response and passes it to the callback
         """
-        if self.postCmd(cmd):
-            reqSeq = -1
-            try:
-                while reqSeq < seq:
-                    data = self.msgq.get(True, 1)
-                    dict = json_helpers.decode(data)
-                    reqSeq = dict['request_seq']
-                if cb:
-                    cb(dict)
-            except queue.Empty:
-                print("queue timeout")
-                if (cb):
-                    cb(self.makeTimeoutMsg(cmd, seq))
-        else:
-            if (cb):
-                cb(self.makeTimeoutMsg(cmd, seq))
+        response = self.sendCmdSync(cmd, seq, SEND_CMD_TIMEOUT)
+        if cb:
+            cb(response)
 
     def sendCmdAsync(self, cmd, cb, seq):
         """
-        Sends the command and registers a callback
+        Sends the command and registers a callback; returns the future of the
+        response, or None if the command could not be sent
         """
-        if self.postCmd(cmd):
-            self.asyncReq[seq] = cb
+        return self.request(cmd, ASYNC_CMD_TIMEOUT, cb)
 
-    def sendCmdSync(self, cmd, seq):
+    def sendCmdSync(self, cmd, seq, timeout=SEND_CMD_SYNC_TIMEOUT):
         """
         Sends the command and wait for the result and returns it
         """
-        if self.postCmd(cmd):
-            reqSeq = -1
-            try:
-                while reqSeq < seq:
-                    data = self.msgq.get(True, 2)
-                    dict = json_helpers.decode(data)
-                    reqSeq = dict['request_seq']
-                return dict
-            except queue.Empty:
-                print("queue timeout")
-                return self.makeTimeoutMsg(cmd, seq)
-        else:
-            return self.makeTimeoutMsg(cmd, seq)
+        future = self.request(cmd, timeout)
+        response = future.wait() if future else None
+        if response is None:
+            if future and self.pending.pop(seq):
+                self.__on_timeout(future)
+            log.debug('Request %s timed out', seq)
+            return self.makeTimeoutMsg(cmd["command"], seq)
+        return response
+
+    def request(self, cmd, timeout, cb=None):
+        """
+        Sends the command as a request and returns the future of its response,
+        or None if it could not be sent
+        """
+        self.expire_pending()
+        lsp_cmd = lsp_helpers.convert_cmd(cmd)
+        if not lsp_cmd or "id" not in lsp_cmd:
+            return None
+        command = cmd.get("command", lsp_cmd["method"])
+        timeout = self.timeouts.get(lsp_cmd["method"], timeout)
+        if not self.supports(lsp_cmd["method"]):
+            future = RequestFuture(lsp_cmd["id"], lsp_cmd["method"], command, timeout, cb)
+            self.__short_circuit(future)
+            return future
+        future = self.pending.add(lsp_cmd["id"], lsp_cmd["method"], command, timeout, cb)
+        if not self.write(lsp_cmd):
+            self.pending.pop(lsp_cmd["id"])
+            return None
+        return future
+
+    def expire_pending(self):
+        """Fails the requests whose deadline has passed"""
+        def on_timeout(future):
+            self.__on_timeout(future)
+            return self.makeTimeoutMsg(future.command, future.req_id)
+        self.pending.expire(on_timeout)
+
+    def __on_timeout(self, future):
+        """Counts a request that was given up on and cancels it on the server"""
+        self.stats.record_timeout(future.method, time.time() - future.sent_time)
+        self.write(lsp_helpers.cancel_message(future.req_id))
+
+    def cancel(self, seq):
+        """
+        Cancels a request that is still waiting for its response; the late
+        response, if any, is dropped. Returns True if the request was pending.
+        """
+        future = self.pending.pop(seq)
+        if future is None or future.done():
+            return False
+        log.debug('Cancelling request %s (%s)', seq, future.method)
+        self.write(lsp_helpers.cancel_message(seq))
+        return True
 
     def postCmd(self, cmd):
         """
         Post command to server; no response needed
         """
-        log.debug('Received order to post command: {0}'.format(cmd))
+        log.debug('Received order to post command: %s', cmd)
         cmd = lsp_helpers.convert_cmd(cmd)
         if not cmd:
             return False
-        self.reqType[cmd["id"]] = cmd["method"]
-        cmd = lsp_helpers.format_request(cmd)
-        log.debug('Sending command: {0}'.format(cmd.splitlines()))
+        return self.write(cmd)
+
+    def write(self, lsp_cmd):
+        """
+        Writes a converted message to the server, or queues it while the
+        initialize handshake is in progress
+        """
         if not self.server_proc:
             log.error("can not send request; node process not running")
             return False
+        elif self.server_proc.poll() is not None:
+            log.debug("can not send request; server process exited")
+            return False
+        elif self.state == STATE_FAILED:
+            log.debug("can not send request; server failed to initialize")
+            return False
         else:
-            self.server_proc.stdin.write(cmd.encode())
-            self.server_proc.stdin.flush()
+            with self.write_lock:
+                if self.state == STATE_INITIALIZING and lsp_cmd.get("method") != "initialize":
+                    self.startup_queue.append(lsp_cmd)
+                else:
+                    self.__write_frame(lsp_cmd)
             return True
 
+    def __write_frame(self, lsp_cmd):
+        """Writes a message; the caller holds write_lock"""
+        body = lsp_helpers.encode_body(lsp_cmd)
+        self.recorder.record(OUTGOING, body)
+        self.stats.record_sent(lsp_cmd.get("method", "response"), len(body), "id" in lsp_cmd and "method" in lsp_cmd)
+        frame = lsp_helpers.frame_body(body)
+        log.debug('Sending command: %s', lsp_cmd)
+        # Header and body go out in a single write
+        self.server_proc.stdin.write(frame)
+        self.server_proc.stdin.flush()
+
     def getEvent(self):
         """
         Try to get event from event queue
@@ -157,80 +465,93 @@ class LspCommClient(node_client.CommClient):
         return ev
 
     @staticmethod
-    def read_msg(stream, msgq, eventq, asyncReq, reqType, proc, asyncEventHandlers):
+    def read_msg(reader, pending, eventq, proc, asyncEventHandlers, recorder=None, stats=None):
         """
         Reader thread helper.
+        Reads the next chunk of server output and dispatches every complete
+        message it contains.
         Return True to indicate the wish to stop reading the next message.
         """
-        state = "init"
-        body_length = 0
-        while state != "body":
-            header = stream.readline().strip()
-            if len(header) == 0:
-                if state == 'init':
-                    # log.info('0 byte line in stream when expecting header')
-                    return proc.poll() is not None
-                else:
-                    # Done reading header
-                    state = "body"
-            else:
-                state = 'header'
-                if header.startswith(LspCommClient.__CONTENT_LENGTH_HEADER):
-                    body_length = int(header[len(LspCommClient.__CONTENT_LENGTH_HEADER):])
+        if not reader.fill():
+            return True
+        for body in reader.frames():
+            if recorder:
+                recorder.record(INCOMING, body)
+            try:
+                LspCommClient.dispatch_msg(body, pending, eventq, asyncEventHandlers, stats)
+            except:
+                log.exception('An error occurred while dispatching an LSP message')
+        return False
 
+    @staticmethod
+    def dispatch_msg(body, pending, eventq, asyncEventHandlers, stats=None):
+        """Decodes a single message body and routes it to its consumer"""
+        body_length = len(body)
         if body_length > 0:
-            data = stream.read(body_length)
-            log.debug('Read body of length: {0}'.format(body_length))
-            data_json = data.decode("utf-8")
-            data_dict = json_helpers.decode(data_json)
+            log.debug('Read body of length: %s', body_length)
+            data_dict = json_helpers.decode(str(body, "utf-8"))
             
-            log.debug('Received raw data: {0}'.format(data_dict))
-            if data_dict.get('result') is not None and data_dict.get("id") is not None:
+            log.debug('Received raw data: %s', data_dict)
+            if "id" in data_dict and "method" not in data_dict:
                 msg_id = data_dict['id']
-                req_type = reqType.pop(msg_id)
-                data_dict = lsp_helpers.convert_response(req_type, data_dict)
-                log.debug('Converted raw data: {0}'.format(data_dict))
-                if data_dict is None or data_dict["type"] != "response":
-                    return False
-                log.debug('Body sequence#: {0}'.format(msg_id))
-                if msg_id in asyncReq:
-                    callback = asyncReq.pop(msg_id, None)
-                    if callback:
-                        callback(data_dict)
-                else:
-                    # Only put in the queue if wasn't an async request
-                    msgq.put(json_helpers.encode(data_dict))
+                received_time = time.time()
+                future = pending.take_response(msg_id)
+                if future is None:
+                    log.debug('Dropping response for unknown request %s', msg_id)
+                    return
+                try:
+                    response = lsp_helpers.convert_response(future.method, data_dict)
+                except:
+                    log.exception('Could not convert response to %s', future.method)
+                    response = None
+                if stats:
+                    stats.record_received(future.method, body_length)
+                    stats.record_response(future.method, received_time - future.sent_time, time.time() - received_time)
+                if response is None:
+                    # null result or error: complete right away instead of
+                    # leaving the caller waiting for its timeout
+                    response = lsp_helpers.failed_response(future.command, data_dict)
+                log.debug('Converted raw data: %s', response)
+                future.set_response(response)
             else:
+                if stats:
+                    stats.record_received(data_dict.get("method", "unknown"), body_length)
                 other = lsp_helpers.convert_other(data_dict)
                 if not other:
                     log.debug('Could not convert raw data.')
-                    return False
-                log.debug('Converted server generated data:{0}'.format(other))
+                    return
+                log.debug('Converted server generated data:%s', other)
                 event_name = other["event"]
                 if event_name in asyncEventHandlers:
                     for cb in asyncEventHandlers[event_name]:
                         # Run <cb> asynchronously to keep read_msg as small as possible
                         sublime.set_timeout(lambda: cb(other), 0)
                 else:
-                    eventq.put(data_json)
+                    eventq.put(other)
         else:
             log.info('Body length of 0 in server stream')
 
-        return False
-
     @staticmethod
     def is_executable(fpath):
         return os.path.isfile(fpath) and os.access(fpath, os.X_OK)
 
 class ServerClient(LspCommClient):
 
-    def __init__(self, binary_path, args, env, root_path):
+    def __init__(self, binary_path, args, env, root_path, workspace_folders=None, stderr_buffer=None):
         """
         Starts a node client (if not already started) and communicate with it.
         The script file to run is passed to the constructor.
         """
-        super(ServerClient, self).__init__(binary_path, args, env, root_path)
-        log.debug('Trying to spawn {0}'.format(' '.join(self.args)))
+        super(ServerClient, self).__init__(binary_path, args, env, root_path, workspace_folders)
+        if stderr_buffer is None:
+            settings = sublime.load_settings("SublimeLsp.sublime-settings")
+            stderr_buffer = StderrBuffer(
+                os.path.basename(self.args[0]),
+                settings.get("server_stderr_lines", DEFAULT_MAX_LINES),
+                settings.get("server_stderr_console_rate", DEFAULT_CONSOLE_RATE))
+        # last lines of stderr, kept across restarts of the server
+        self.stderr_buffer = stderr_buffer
+        log.debug('Trying to spawn %s', ' '.join(self.args))
         try:
             if os.name == "nt":
                 # linux subprocess module does not have STARTUPINFO
@@ -240,55 +561,54 @@ class ServerClient(LspCommClient):
                 self.server_proc = subprocess.Popen(self.args,
                                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=si, cwd=self.root_path, env=self.env)
             else:
-                log.debug("opening " + binary_path)
+                log.debug('opening %s', binary_path)
                 self.server_proc = subprocess.Popen(self.args,
                                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.root_path, env=self.env)
         except Exception as err:
-            print(err)
+            log.error('Could not spawn %s: %s', binary_path, err)
             self.server_proc = None
+            # reported by check_health, so the watchdog retries with backoff
+            self.state = STATE_FAILED
         # start reader thread
         if self.server_proc and (not self.server_proc.poll()):
-            log.debug("server process " + str(self.server_proc.pid))
+            log.debug('server process %s', self.server_proc.pid)
             log.debug("starting reader thread")
             readerThread = threading.Thread(target=ServerClient.__reader, args=(
-                self.server_proc.stdout, self.msgq, self.eventq, self.asyncReq, self.reqType, self.server_proc, self.event_handlers))
+                self.server_proc.stdout, self.pending, self.eventq, self.server_proc, self.event_handlers, self.recorder, self.stats))
             readerThread.daemon = True
             readerThread.start()
             log.debug("starting logger thread")
-            loggerThread = threading.Thread(target=ServerClient.__logger, args=(
-                self.server_proc.stderr, 1))
+            loggerThread = threading.Thread(target=self.stderr_buffer.pump, args=(
+                self.server_proc.stderr,))
             loggerThread.daemon = True
             loggerThread.start()
 
-        self.postCmd(lsp_helpers.init_message(self.root_path, self.server_proc.pid))
+        if self.server_proc:
+            self.start_recording_if_enabled()
+            self.initialize()
 
     @staticmethod
-    def __reader(stream, msgq, eventq, asyncReq, reqType, proc, eventHandlers):
+    def __reader(stream, pending, eventq, proc, eventHandlers, recorder, stats):
         """ Main function for reader thread """
+        reader = FrameReader(stream)
         while True:
             try:
-                if LspCommClient.read_msg(stream, msgq, eventq, asyncReq, reqType, proc, eventHandlers):
+                if LspCommClient.read_msg(reader, pending, eventq, proc, eventHandlers, recorder, stats):
                     log.debug("server exited")
-                    proc.stderr.close()
+                    LspCommClient.fail_pending(pending, "server exited")
+                    recorder.stop()
                     return
             except:
                 log.exception('An error occurred while reading LSP messages')
 
-
-    @staticmethod
-    def __logger(stream, bar):
-        """ Dumps server's stderr to stderr """
-        try:
-            for line in iter(stream.readline, ""):
-                print(">" + line.decode("utf-8").rstrip(), file=sys.stderr)
-        except:
-            pass
+    def get_stderr_buffer(self):
+        return self.stderr_buffer
 
 class WorkerClient(LspCommClient):
     stop_worker = False
     
-    def __init__(self, binary_path, args, env, root_path):
-        super(WorkerClient, self).__init__(binary_path, args, env, root_path)
+    def __init__(self, binary_path, args, env, root_path, workspace_folders=None):
+        super(WorkerClient, self).__init__(binary_path, args, env, root_path, workspace_folders)
 
     def start(self):
         WorkerClient.stop_worker = False
@@ -305,25 +625,34 @@ class WorkerClient(LspCommClient):
 
         # start reader thread
         if self.server_proc and (not self.server_proc.poll()):
-            log.debug("worker proc " + str(self.server_proc))
+            log.debug('worker proc %s', self.server_proc)
             log.debug("starting worker thread")
             workerThread = threading.Thread(target=WorkerClient.__reader, args=(
-                self.server_proc.stdout, self.msgq, self.eventq, self.asyncReq, self.reqType, self.server_proc, self.event_handlers))
+                self.server_proc.stdout, self.pending, self.eventq, self.server_proc, self.event_handlers, self.recorder, self.stats))
             workerThread.daemon = True
             workerThread.start()
 
+        if self.server_proc:
+            self.start_recording_if_enabled()
+            self.initialize()
+
     def stop(self):
         WorkerClient.stop_worker = True
         self.server_proc.kill()
         self.server_proc = None
+        self.state = STATE_STOPPED
+        self.capabilities = None
 
     @staticmethod
-    def __reader(stream, msgq, eventq, asyncReq, reqType, proc, eventHandlers):
+    def __reader(stream, pending, eventq, proc, eventHandlers, recorder, stats):
         """ Main function for worker thread """
+        reader = FrameReader(stream)
         while True:
             try:
-                if LspCommClient.read_msg(stream, msgq, eventq, asyncReq, reqType, proc, eventHandlers) or WorkerClient.stop_worker:
+                if LspCommClient.read_msg(reader, pending, eventq, proc, eventHandlers, recorder, stats) or WorkerClient.stop_worker:
                     log.debug("worker exited")
+                    LspCommClient.fail_pending(pending, "worker exited")
+                    recorder.stop()
                     return
             except:
                 log.exception('An error occurred while reading LSP messages')
@@ -1,6 +1,6 @@
-from . import json_helpers
 import sublime
 import json
+import os
 import sys
 
 if int(sublime.version()) < 3000:
@@ -10,7 +10,73 @@ else:
     import urllib.request as urllib
     from urllib.parse import urljoin
 
-def init_message(root_path, process_id):
+# Compact separators and raw (non-escaped) unicode keep the payload small
+_request_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+# Features this client can use, advertised in the initialize request
+CLIENT_CAPABILITIES = {
+    "workspace": {
+        "workspaceFolders": True
+    },
+    "textDocument": {
+        "synchronization": {
+            "dynamicRegistration": False,
+            "didSave": False
+        },
+        "hover": {
+            "dynamicRegistration": False,
+            "contentFormat": ["plaintext", "markdown"]
+        },
+        "completion": {
+            "dynamicRegistration": False,
+            "completionItem": {
+                "snippetSupport": False,
+                "documentationFormat": ["plaintext", "markdown"],
+                # items can leave these out; completionItem/resolve fills them in
+                "resolveSupport": {
+                    "properties": ["detail", "documentation"]
+                }
+            }
+        },
+        "signatureHelp": {
+            "dynamicRegistration": False
+        },
+        "definition": {
+            "dynamicRegistration": False
+        },
+        "references": {
+            "dynamicRegistration": False
+        },
+        "documentHighlight": {
+            "dynamicRegistration": False
+        },
+        "publishDiagnostics": {
+            "relatedInformation": False
+        }
+    }
+}
+
+# Server capability that has to be present before a method can be requested;
+# dots separate the keys of nested capabilities
+METHOD_CAPABILITIES = {
+    "textDocument/hover": "hoverProvider",
+    "textDocument/definition": "definitionProvider",
+    "textDocument/references": "referencesProvider",
+    "textDocument/completion": "completionProvider",
+    "completionItem/resolve": "completionProvider.resolveProvider",
+    "textDocument/signatureHelp": "signatureHelpProvider",
+    "textDocument/documentHighlight": "documentHighlightProvider",
+    "textDocument/formatting": "documentFormattingProvider",
+    "textDocument/rangeFormatting": "documentRangeFormattingProvider",
+    "textDocument/onTypeFormatting": "documentOnTypeFormattingProvider",
+    "textDocument/rename": "renameProvider",
+    "textDocument/codeAction": "codeActionProvider",
+    "textDocument/documentSymbol": "documentSymbolProvider",
+    "workspace/symbol": "workspaceSymbolProvider"
+}
+
+
+def init_message(root_path, process_id, workspace_folders=None):
     cmd = {
         "id": 0,
         "method": "initialize",
@@ -18,14 +84,97 @@ def init_message(root_path, process_id):
         "params": {
             "processId": process_id,
             "rootPath": root_path,
-            "capabilities": {},
+            "rootUri": filename_to_uri(root_path) if root_path else None,
+            "capabilities": CLIENT_CAPABILITIES,
+        }
+    }
+    if workspace_folders:
+        cmd["params"]["workspaceFolders"] = [workspace_folder(path) for path in workspace_folders]
+    return cmd
+
+
+def workspace_folder(path):
+    return {
+        "uri": filename_to_uri(path),
+        "name": os.path.basename(path.rstrip("/\\")) or path
+    }
+
+
+def did_change_workspace_folders_message(added=(), removed=()):
+    return {
+        "jsonrpc": "2.0",
+        "method": "workspace/didChangeWorkspaceFolders",
+        "params": {
+            "event": {
+                "added": [workspace_folder(path) for path in added],
+                "removed": [workspace_folder(path) for path in removed]
+            }
         }
     }
-    return json_helpers.encode(cmd)
 
 
-def convert_cmd(str_cmd):
-    old_cmd = json_helpers.decode(str_cmd)
+def initialized_message():
+    return {
+        "jsonrpc": "2.0",
+        "method": "initialized",
+        "params": {}
+    }
+
+
+def supports_method(capabilities, method):
+    """
+    False if the server capabilities rule out <method>; methods without a
+    matching capability, and servers whose capabilities are unknown, are
+    given the benefit of the doubt
+    """
+    if capabilities is None:
+        return True
+    capability = METHOD_CAPABILITIES.get(method)
+    if capability is None:
+        return True
+    value = capabilities
+    for key in capability.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return bool(value)
+
+
+def shutdown_message(request_id):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "shutdown"
+    }
+
+
+def exit_message():
+    return {
+        "jsonrpc": "2.0",
+        "method": "exit"
+    }
+
+
+def cancel_message(request_id):
+    return {
+        "jsonrpc": "2.0",
+        "method": "$/cancelRequest",
+        "params": {
+            "id": request_id
+        }
+    }
+
+
+# Names of the LSP CompletionItemKind values, indexed by value
+COMPLETION_KINDS = (
+    "", "text", "method", "function", "constructor", "field", "variable", "class", "interface", "module",
+    "property", "unit", "value", "enum", "keyword", "snippet", "color", "file", "reference", "folder",
+    "enum member", "constant", "struct", "event", "operator", "type parameter"
+)
+
+# Commands that map to LSP notifications, which carry no id and get no response
+NOTIFICATION_COMMANDS = ("change", "open", "close")
+
+
+def convert_cmd(old_cmd):
 
     # shortcut if it is hand-jammed init message
     if old_cmd.get("method"):
@@ -34,9 +183,10 @@ def convert_cmd(str_cmd):
     args = old_cmd.get("arguments")
     command = old_cmd["command"]
     new_cmd = {
-        "id": old_cmd["seq"],
         "jsonrpc": "2.0"
     }
+    if command not in NOTIFICATION_COMMANDS:
+        new_cmd["id"] = old_cmd["seq"]
     if command == "quickinfo" or command == "definition":
         new_cmd["method"] = "textDocument/hover" if command == "quickinfo" else "textDocument/definition"
         new_cmd["params"] = {
@@ -46,14 +196,27 @@ def convert_cmd(str_cmd):
             }
         }
         return new_cmd
+    elif command == "completions":
+        new_cmd["method"] = "textDocument/completion"
+        new_cmd["params"] = {
+            "position": convert_position_to_lsp(args),
+            "textDocument": {
+                "uri": filename_to_uri(args["file"])
+            }
+        }
+        return new_cmd
+    elif command == "completionEntryDetails":
+        new_cmd["method"] = "completionItem/resolve"
+        new_cmd["params"] = args["item"]
+        return new_cmd
     elif command == "change":
         new_cmd["method"] = "textDocument/didChange"
         new_cmd["params"] = {
             "textDocument": {
                 "uri": filename_to_uri(args["file"]),
-                "version": 1
+                "version": args["version"]
             },
-            "contentChanges": convert_change_to_lsp(args)
+            "contentChanges": args["changes"]
         }
         return new_cmd
     elif command == "open":
@@ -62,11 +225,19 @@ def convert_cmd(str_cmd):
             "textDocument": {
                 "uri": filename_to_uri(args["file"]),
                 "languageId": "go",
-                "version": 0,
+                "version": args.get("version", 0),
                 "text": args["text"]
             },
         }
         return new_cmd
+    elif command == "close":
+        new_cmd["method"] = "textDocument/didClose"
+        new_cmd["params"] = {
+            "textDocument": {
+                "uri": filename_to_uri(args["file"])
+            },
+        }
+        return new_cmd
     elif command == "references":
         new_cmd["method"] = "textDocument/references"
         new_cmd["params"] = {
@@ -118,16 +289,6 @@ def convert_position_from_lsp(args):
     }
 
 
-def convert_change_to_lsp(args):
-    return [
-        {
-            # "range": convert_range_to_lsp(args),
-            # "rangeLength": 5,
-            "text": args["insertString"]
-        }
-    ]
-
-
 def convert_filename_to_lsp(args, version=None):
     return_val = {
         "uri": filename_to_uri(args["file"])
@@ -147,12 +308,21 @@ def convert_lsp_to_filename(uri):
     return uri
 
 def format_request(request):
-    """Converts the request into json and adds the Content-Length header"""
-    content = json.dumps(request, indent=2)
-    content_length = len(content)
+    """Encodes the request as compact UTF-8 JSON behind a Content-Length header
+
+    Returns the complete frame as bytes; the header carries the byte length
+    of the body so non-ASCII text keeps the framing intact.
+    """
+    return frame_body(encode_body(request))
+
 
-    result = "Content-Length: {}\r\n\r\n{}".format(content_length, content)
-    return result
+def encode_body(request):
+    return _request_encoder.encode(request).encode("utf-8")
+
+
+def frame_body(body):
+    header = ("Content-Length: %d\r\n\r\n" % len(body)).encode("ascii")
+    return header + body
 
 
 def convert_other(msg):
@@ -188,18 +358,62 @@ def convert_hover(result):
         "language": "markdown"
     }
 
+def convert_completion_item(item):
+    """A CompletionItem as a legacy completion entry"""
+    kind = item.get("kind")
+    return {
+        "name": item["label"],
+        "kind": COMPLETION_KINDS[kind] if kind and kind < len(COMPLETION_KINDS) else "",
+        "kindModifiers": "",
+        "sortText": item.get("sortText") or item["label"],
+        "filterText": item.get("filterText") or item["label"],
+        "insertText": item.get("insertText") or item["label"],
+        # sent back as is to resolve the details of the item
+        "item": item
+    }
+
+
+def convert_documentation(documentation):
+    """The text of a string or MarkupContent"""
+    if isinstance(documentation, dict):
+        return documentation.get("value", "")
+    return documentation or ""
+
+
+def failed_response(command, response):
+    """Builds the unsuccessful legacy response for an error or empty result"""
+    error = response.get("error")
+    return {
+        "seq": 0,
+        "request_seq": response.get("id"),
+        "success": False,
+        "command": command,
+        "message": error.get("message") if error else "no result",
+        "body": None,
+        "type": "response"
+    }
+
+
 def convert_response(request_type, response):
-    if response.get("id") == 0:
-        return None
     success = response.get("result") is not None
     if not success:
         return None
     if not response.get("result"):
         return None
 
-    if request_type == "textDocument/hover":
+    if request_type == "initialize":
+        return {
+            "seq": 0,
+            "request_seq": response["id"],
+            "success": success,
+            "command": "initialize",
+            "body": response["result"],
+            "type": "response"
+        }
+    elif request_type == "textDocument/hover":
         result = response["result"]
-        range = result["range"]
+        # the range is optional; without it the response only covers the requested position
+        range = result.get("range")
         return {
             "seq": 0,
             "request_seq": response["id"],
@@ -231,6 +445,35 @@ def convert_response(request_type, response):
             }],
             "type": "response"
         }
+    elif request_type == "textDocument/completion":
+        result = response["result"]
+        # the result is either a CompletionList or a plain array of items
+        items = result["items"] if isinstance(result, dict) else result
+        return {
+            "seq": 0,
+            "request_seq": response["id"],
+            "success": success,
+            "command": "completions",
+            "body": [convert_completion_item(item) for item in items],
+            # the server has more items than it sent; they have to be asked
+            # for again as the user keeps typing
+            "isIncomplete": isinstance(result, dict) and bool(result.get("isIncomplete")),
+            "type": "response"
+        }
+    elif request_type == "completionItem/resolve":
+        result = response["result"]
+        return {
+            "seq": 0,
+            "request_seq": response["id"],
+            "success": success,
+            "command": "completionEntryDetails",
+            "body": {
+                "name": result["label"],
+                "detail": result.get("detail") or "",
+                "documentation": convert_documentation(result.get("documentation"))
+            },
+            "type": "response"
+        }
     elif request_type == "textDocument/references":
         referencesRespBody = {
                 "refs": []
@@ -31,6 +31,34 @@ class CommClient(object):
     
     def sendCmdAsync(self, cmd, cb): pass
 
+    def cancel(self, seq): pass
+
+    def get_sync_kind(self): pass
+
+    def get_startup_time(self): pass
+
+    def add_workspace_folder(self, path): pass
+
+    def get_rss(self): pass
+
+    def shutdown(self, seq): pass
+
+    def check_health(self, hang_timeout): pass
+
+    def kill(self): pass
+
+    def get_workspace_folders(self): return []
+
+    def get_stderr_buffer(self): pass
+
+    def get_stats(self): return {}
+
+    def get_completion_triggers(self): return []
+
+    def get_event_handlers(self): return {}
+
+    def get_short_circuit_count(self): return 0
+
 
 class NodeCommClient(CommClient):
     __CONTENT_LENGTH_HEADER = b"Content-Length: "
@@ -51,13 +79,12 @@ class NodeCommClient(CommClient):
         self.breakpoints = []
 
     def makeTimeoutMsg(self, cmd, seq):
-        jsonDict = json_helpers.decode(cmd)
         timeoutMsg = {
             "seq": 0,
             "type": "response",
             "success": False,
             "request_seq": seq,
-            "command": jsonDict["command"],
+            "command": cmd["command"],
             "message": "timeout"
         }
         return timeoutMsg
@@ -69,6 +96,10 @@ class NodeCommClient(CommClient):
         if cb not in event_handlers[event_name]:
             event_handlers[event_name].append(cb)
 
+    def get_event_handlers(self):
+        """A copy of the registered event handlers, by event name"""
+        return dict((event_name, list(callbacks)) for event_name, callbacks in self.event_handlers.items())
+
     def started(self):
         return self.server_proc is not None
 
@@ -91,8 +122,7 @@ class NodeCommClient(CommClient):
             reqSeq = -1
             try:
                 while reqSeq < seq:
-                    data = self.msgq.get(True, 1)
-                    dict = json_helpers.decode(data)
+                    dict = self.msgq.get(True, 1)
                     reqSeq = dict['request_seq']
                 if cb:
                     cb(dict)
@@ -119,8 +149,7 @@ class NodeCommClient(CommClient):
             reqSeq = -1
             try:
                 while reqSeq < seq:
-                    data = self.msgq.get(True, 2)
-                    dict = json_helpers.decode(data)
+                    dict = self.msgq.get(True, 2)
                     reqSeq = dict['request_seq']
                 return dict
             except queue.Empty:
@@ -138,7 +167,7 @@ class NodeCommClient(CommClient):
             log.error("can not send request; node process not running")
             return False
         else:
-            cmd = cmd + "\n"
+            cmd = json_helpers.encode(cmd) + "\n"
             self.server_proc.stdin.write(cmd.encode())
             self.server_proc.stdin.flush()
             return True
@@ -177,20 +206,20 @@ class NodeCommClient(CommClient):
 
         if body_length > 0:
             data = stream.read(body_length)
-            log.debug('Read body of length: {0}'.format(body_length))
+            log.debug('Read body of length: %s', body_length)
             data_json = data.decode("utf-8")
             data_dict = json_helpers.decode(data_json)
             if data_dict['type'] == "response":
                 print(data_dict)
                 request_seq = data_dict['request_seq']
-                log.debug('Body sequence#: {0}'.format(request_seq))
+                log.debug('Body sequence#: %s', request_seq)
                 if request_seq in asyncReq:
                     callback = asyncReq.pop(request_seq, None)
                     if callback:
                         callback(data_dict)
                 else:
                     # Only put in the queue if wasn't an async request
-                    msgq.put(data_json)
+                    msgq.put(data_dict)
             elif data_dict["type"] == "event":
                 print(data_dict)
                 event_name = data_dict["event"]
@@ -199,7 +228,7 @@ class NodeCommClient(CommClient):
                         # Run <cb> asynchronously to keep read_msg as small as possible
                         sublime.set_timeout(lambda: cb(data_dict), 0)
                 else:
-                    eventq.put(data_json)
+                    eventq.put(data_dict)
         else:
             log.info('Body length of 0 in server stream')
 
@@ -269,14 +298,14 @@ class ServerClient(NodeCommClient):
                     self.server_proc = subprocess.Popen([node_path, script_path],
                                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE, startupinfo=si)
                 else:
-                    log.debug("opening " + node_path + " " + script_path)
+                    log.debug('opening %s %s', node_path, script_path)
                     self.server_proc = subprocess.Popen([node_path, script_path],
                                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE)
             except:
                 self.server_proc = None
         # start reader thread
         if self.server_proc and (not self.server_proc.poll()):
-            log.debug("server proc " + str(self.server_proc))
+            log.debug('server proc %s', self.server_proc)
             log.debug("starting reader thread")
             readerThread = threading.Thread(target=ServerClient.__reader, args=(
                 self.server_proc.stdout, self.msgq, self.eventq, self.asyncReq, self.server_proc, self.event_handlers))
@@ -313,7 +342,7 @@ class WorkerClient(NodeCommClient):
 
         # start reader thread
         if self.server_proc and (not self.server_proc.poll()):
-            log.debug("worker proc " + str(self.server_proc))
+            log.debug('worker proc %s', self.server_proc)
             log.debug("starting worker thread")
             workerThread = threading.Thread(target=WorkerClient.__reader, args=(
                 self.server_proc.stdout, self.msgq, self.eventq, self.asyncReq, self.server_proc, self.event_handlers))
@@ -1,4 +1,5 @@
 import os
+import subprocess
 import sys
 
 # From shutil.which introduced in Python 3.3
@@ -62,4 +63,21 @@ def which(cmd, mode=os.F_OK | os.X_OK, path=None):
                 name = os.path.join(dir, thefile)
                 if _access_check(name, mode):
                     return name
-    return None
\ No newline at end of file
+    return None
+
+def get_rss(pid):
+    """Resident memory of process <pid> in bytes, or None if unavailable"""
+    try:
+        with open("/proc/{0}/status".format(pid)) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    if sys.platform == "win32":
+        return None
+    try:
+        output = subprocess.check_output(["ps", "-o", "rss=", "-p", str(pid)])
+        return int(output.strip()) * 1024
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        return None
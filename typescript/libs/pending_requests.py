@@ -0,0 +1,131 @@
+import threading
+import time
+
+from .logger import log
+
+
+class RequestFuture(object):
+    """The eventual response to a single request sent to a server"""
+
+    def __init__(self, req_id, method, command, timeout, callback=None):
+        self.req_id = req_id
+        # LSP method, needed to convert the response
+        self.method = method
+        # Legacy command name, used for synthesized responses
+        self.command = command
+        self.sent_time = time.time()
+        self.deadline = self.sent_time + timeout
+        self.callback = callback
+        self.response = None
+        self.done_time = None
+        self.__done = threading.Event()
+
+    def done(self):
+        return self.__done.is_set()
+
+    def set_response(self, response):
+        """Completes the future and runs its callback on the calling thread"""
+        self.response = response
+        self.done_time = time.time()
+        self.__done.set()
+        if self.callback:
+            self.callback(response)
+
+    def wait(self):
+        """Blocks until the response arrives or the deadline passes
+
+        Returns the response, or None if the deadline passed first.
+        """
+        remaining = self.deadline - time.time()
+        if remaining > 0:
+            self.__done.wait(remaining)
+        return self.response
+
+
+class PendingRequests(object):
+    """Thread-safe table of in-flight requests keyed by request id"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.table = {}
+        # send time of the oldest request made since the last response, or
+        # None; a server that stays silent for long is considered hung
+        self.waiting_since = None
+
+    def add(self, req_id, method, command, timeout, callback=None):
+        future = RequestFuture(req_id, method, command, timeout, callback)
+        with self.lock:
+            self.table[req_id] = future
+            if self.waiting_since is None:
+                self.waiting_since = future.sent_time
+        return future
+
+    def pop(self, req_id):
+        with self.lock:
+            return self.table.pop(req_id, None)
+
+    def take_response(self, req_id):
+        """Pops the request a response arrived for and notes that the server is alive"""
+        with self.lock:
+            self.waiting_since = None
+            return self.table.pop(req_id, None)
+
+    def starved_for(self):
+        """Seconds the server has left requests without any response"""
+        with self.lock:
+            if self.waiting_since is None:
+                return 0
+            return time.time() - self.waiting_since
+
+    def get(self, req_id):
+        with self.lock:
+            return self.table.get(req_id)
+
+    def resolve(self, req_id, response):
+        """Completes the request with the given id
+
+        Returns False if nobody is waiting for it any more.
+        """
+        future = self.pop(req_id)
+        if future is None:
+            log.debug('No pending request for response %s', req_id)
+            return False
+        future.set_response(response)
+        return True
+
+    def expire(self, make_timeout_msg):
+        """Fails every request whose deadline has passed"""
+        now = time.time()
+        with self.lock:
+            overdue = [future for future in self.table.values() if future.deadline <= now]
+            for future in overdue:
+                del self.table[future.req_id]
+        for future in overdue:
+            log.debug('Request %s (%s) timed out', future.req_id, future.method)
+            future.set_response(make_timeout_msg(future))
+
+    def fail_all(self, make_failure_msg):
+        """Completes every pending request with a failure right away"""
+        with self.lock:
+            failed = list(self.table.values())
+            self.table.clear()
+            self.waiting_since = None
+        for future in failed:
+            try:
+                future.set_response(make_failure_msg(future))
+            except Exception:
+                # one broken callback must not leave the others waiting
+                log.exception('Callback of request %s (%s) failed', future.req_id, future.method)
+        return len(failed)
+
+    def in_flight(self):
+        """Number of requests awaiting a response, per method"""
+        counts = {}
+        with self.lock:
+            for future in self.table.values():
+                counts[future.method] = counts.get(future.method, 0) + 1
+        return counts
+
+    def __len__(self):
+        with self.lock:
+            return len(self.table)
@@ -297,11 +297,11 @@ def get_popup_manager():
 
             print(rel_path)
 
-            log.info('Popup resource path: {0}'.format(rel_path))
+            log.info('Popup resource path: %s', rel_path)
             popup_text = sublime.load_resource(rel_path)
             re_remove = re.compile("[\n\t\r]")
             popup_text = re_remove.sub("", popup_text)
-            log.info('Loaded tooltip template from {0}'.format(rel_path))
+            log.info('Loaded tooltip template from %s', rel_path)
 
             _set_up_popup_style()
             PopupManager.html_template = Template(popup_text)
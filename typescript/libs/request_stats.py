@@ -0,0 +1,118 @@
+import collections
+import threading
+
+# round-trip times kept per method for the percentiles
+LATENCY_SAMPLES = 1000
+
+
+class MethodStats(object):
+    """Counters of a single LSP method"""
+
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.convert_time = 0.0
+        self.convert_count = 0
+        # most recent round-trip times in seconds
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+
+class RequestStats(object):
+    """
+    Per-method request counts, timeouts, round-trip latencies, wire bytes
+    and response conversion time of one client; safe to update from the
+    UI and reader threads
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = collections.defaultdict(MethodStats)
+
+    def record_sent(self, method, byte_count, is_request):
+        with self.lock:
+            stats = self.methods[method]
+            stats.bytes_sent += byte_count
+            if is_request:
+                stats.count += 1
+
+    def record_received(self, method, byte_count):
+        with self.lock:
+            self.methods[method].bytes_received += byte_count
+
+    def record_response(self, method, latency, convert_time):
+        with self.lock:
+            stats = self.methods[method]
+            stats.latencies.append(latency)
+            stats.convert_time += convert_time
+            stats.convert_count += 1
+
+    def record_timeout(self, method, waited=None):
+        """
+        Counts a request that got no response; the <waited> seconds count as
+        a round-trip time, so that adaptive timeouts grow after timeouts
+        """
+        with self.lock:
+            stats = self.methods[method]
+            stats.timeouts += 1
+            if waited is not None:
+                stats.latencies.append(waited)
+
+    def get_latencies(self, method):
+        """The recent round-trip times of <method> in seconds"""
+        with self.lock:
+            stats = self.methods.get(method)
+            return list(stats.latencies) if stats else []
+
+    def snapshot(self, in_flight=None):
+        """
+        A dict of plain values per method; <in_flight> maps methods to their
+        number of requests awaiting a response
+        """
+        in_flight = in_flight or {}
+        result = {}
+        with self.lock:
+            for method, stats in self.methods.items():
+                latencies = sorted(stats.latencies)
+                result[method] = {
+                    "count": stats.count,
+                    "timeout_ms": None,
+                    "in_flight": in_flight.get(method, 0),
+                    "timeouts": stats.timeouts,
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p95_ms": percentile(latencies, 95) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                    "bytes_sent": stats.bytes_sent,
+                    "bytes_received": stats.bytes_received,
+                    "convert_ms": stats.convert_time * 1000 / stats.convert_count if stats.convert_count else 0
+                }
+        return result
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an ascending list, 0 if it is empty"""
+    if not sorted_values:
+        return 0
+    rank = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+def format_method_stats(methods):
+    """Renders a snapshot of RequestStats as the lines of a table"""
+    columns = ("count", "in_flight", "timeouts", "timeout_ms", "p50_ms", "p95_ms", "p99_ms",
+               "bytes_sent", "bytes_received", "convert_ms")
+    width = max([len("method")] + [len(method) for method in methods])
+    lines = ["  ".join(["method".ljust(width)] + [column.rjust(14) for column in columns])]
+    for method in sorted(methods):
+        values = methods[method]
+        cells = []
+        for column in columns:
+            value = values[column]
+            if value is None:
+                value = "-"
+            elif isinstance(value, float):
+                value = "%.1f" % value
+            cells.append(str(value).rjust(14))
+        lines.append("  ".join([method.ljust(width)] + cells))
+    return lines
@@ -0,0 +1,35 @@
+from .request_stats import percentile
+
+# answered requests of a method needed before its timeout adapts
+MIN_SAMPLES = 20
+# a request may take this multiple of the p99 round-trip time of its method
+DEFAULT_FACTOR = 3
+# bounds of an adapted timeout in seconds
+DEFAULT_MIN_TIMEOUT = 0.3
+DEFAULT_MAX_TIMEOUT = 10
+
+
+class RequestTimeouts(object):
+    """
+    Timeouts per LSP method, derived from the recent round-trip times in a
+    RequestStats: p99 times <factor>, clamped to [<min_timeout>, <max_timeout>].
+    <overrides> maps methods to fixed timeouts in seconds.
+    """
+
+    def __init__(self, stats, overrides=None, factor=DEFAULT_FACTOR,
+                 min_timeout=DEFAULT_MIN_TIMEOUT, max_timeout=DEFAULT_MAX_TIMEOUT):
+        self.stats = stats
+        self.overrides = dict(overrides or {})
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+    def get(self, method, default=None):
+        """The timeout of <method> in seconds, <default> until enough responses were seen"""
+        if method in self.overrides:
+            return self.overrides[method]
+        latencies = self.stats.get_latencies(method)
+        if len(latencies) < MIN_SAMPLES:
+            return default
+        timeout = percentile(sorted(latencies), 99) * self.factor
+        return min(max(timeout, self.min_timeout), self.max_timeout)
@@ -1,80 +1,202 @@
 ﻿import sublime
+import threading
 
-from . import json_helpers
+from .document_store import DocumentStore, SYNC_NONE
 from .global_vars import IS_ST2
+from .hover_cache import HoverCache
+from .logger import log
 from .node_client import CommClient
 from .text_helpers import Location
 
+# commands that synchronize documents and must not trigger a flush themselves
+SYNC_COMMANDS = ("open", "change", "close")
+
+# default length of the window in which document modifications are coalesced
+SYNC_COALESCE_MS = 150
+
 
 class ServiceProxy:
     def __init__(self, worker_client=CommClient(), server_client=CommClient()):
         self.__comm = server_client
         self.__worker_comm = worker_client
         self.seq = 1
+        self.seq_lock = threading.Lock()
+        # text and version of the documents open on the server
+        self.documents = DocumentStore()
+        # (command, file) -> seq of the latest cancellable request
+        self.latest_requests = {}
+        self.cancel_counts = {}
+        # quick info by document version, shared by the status bar, the
+        # documentation popup and hovering
+        self.hover_cache = HoverCache()
 
     def increase_seq(self):
-        temp = self.seq
-        self.seq += 1
+        """Allocates the next request id; safe to call from any thread"""
+        with self.seq_lock:
+            temp = self.seq
+            self.seq += 1
         return temp
 
     def exit(self):
-        req_dict = self.create_req_dict("exit")
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.postCmd(json_str)
+        """Shuts the server and the worker down without waiting for them"""
+        self.__comm.shutdown(self.increase_seq())
         if self.__worker_comm.started():
-            self.__worker_comm.postCmd(json_str)
+            self.__worker_comm.shutdown(self.increase_seq())
 
     def stop_worker(self):
-        req_dict = self.create_req_dict("exit")
-        json_str = json_helpers.encode(req_dict)
         if self.__worker_comm.started():
-            self.__worker_comm.postCmd(json_str)
+            self.__worker_comm.shutdown(self.increase_seq())
+
+    def replay_documents(self, documents):
+        """
+        Opens on this (new) server every document of another DocumentStore,
+        including the modifications still queued there; versions carry on
+        from the old server
+        """
+        snapshot = dict((document.path, document) for document in documents.snapshot())
+        for pending in documents.take_pending():
+            document = snapshot.get(pending.path)
+            if document:
+                document.text = pending.get_text()
+                document.version += 1
+        for document in snapshot.values():
+            self.open(document.path, document.text, document.version)
+        log.debug('Reopened %s document(s)', len(snapshot))
+
+    def check_health(self, hang_timeout):
+        return self.__comm.check_health(hang_timeout)
+
+    def kill(self):
+        """Stops the server and worker processes without the shutdown handshake"""
+        self.__comm.kill()
+        if self.__worker_comm.started():
+            self.__worker_comm.kill()
+
+    def get_workspace_folders(self):
+        return self.__comm.get_workspace_folders()
+
+    def get_stderr_buffer(self):
+        return self.__comm.get_stderr_buffer()
+
+    def get_completion_triggers(self):
+        return self.__comm.get_completion_triggers()
+
+    def get_stderr_lines(self, count):
+        """The last <count> lines the server wrote to stderr"""
+        stderr_buffer = self.__comm.get_stderr_buffer()
+        return stderr_buffer.tail(count) if stderr_buffer else []
 
     def configure(self, host_info="Sublime Text", file=None, format_options=None):
         args = {"hostInfo": host_info, "formatOptions": format_options, "file": file}
         req_dict = self.create_req_dict("configure", args)
-        json_str = json_helpers.encode(req_dict)
-        response_dict = self.__comm.postCmd(json_str)
+        response_dict = self.__comm.postCmd(req_dict)
         if self.__worker_comm.started():
-            self.__worker_comm.postCmd(json_str)
-
-    def change(self, path, begin_location=Location(1, 1), end_location=Location(1, 1), insertString=""):
-        args = {
-            "file": path,
-            # "line": begin_location.line,
-            # "offset": begin_location.offset,
-            # "endLine": end_location.line,
-            # "endOffset": end_location.offset,
-            "insertString": insertString
+            self.__worker_comm.postCmd(req_dict)
+
+    def change(self, path, text, edits=None):
+        """
+        Brings the server copy of <path> up to date with <text>
+
+        <edits> are optional (begin, end, insertString) offsets describing how
+        the last-sent text became <text>; the change is diffed otherwise.
+        """
+        with self.documents.lock:
+            if not self.documents.is_open(path):
+                self.open(path, text)
+                return
+            sync_kind = self.__comm.get_sync_kind()
+            changes = self.documents.update(path, text, edits, sync_kind)
+            if changes is None or sync_kind == SYNC_NONE:
+                return
+            args = {
+                "file": path,
+                "version": self.documents.get(path).version,
+                "changes": changes
+            }
+            req_dict = self.create_req_dict("change", args)
+            self.__comm.postCmd(req_dict)
+            if self.__worker_comm.started():
+                self.__worker_comm.postCmd(req_dict)
+
+    def queue_change(self, path, get_text, edits=None, change_id=None):
+        """
+        Queues a modification of <path>. Modifications are coalesced and sent
+        as one change when the sync window closes, or right before the next
+        request about <path>, whichever comes first.
+        """
+        if self.documents.queue_change(path, get_text, edits, change_id):
+            delay = sublime.load_settings("SublimeLsp.sublime-settings").get("sync_coalesce_ms", SYNC_COALESCE_MS)
+            sublime.set_timeout(self.flush_changes, delay)
+
+    def flush_changes(self, path=None):
+        """Sends the queued changes of <path>, or of every document"""
+        for pending in self.documents.take_pending(path):
+            log.debug('Flushing %s coalesced modification(s) of %s', pending.depth(), pending.path)
+            self.change(pending.path, pending.get_text(), pending.edits)
+
+    def get_sync_stats(self):
+        return self.documents.get_sync_stats()
+
+    def add_workspace_folder(self, path):
+        """Lets a server shared by several roots know about <path>"""
+        self.__comm.add_workspace_folder(path)
+        self.__worker_comm.add_workspace_folder(path)
+
+    def get_memory_usage(self):
+        """Resident memory of the server and worker processes in bytes"""
+        return sum(rss for rss in (self.__comm.get_rss(), self.__worker_comm.get_rss()) if rss)
+
+    def get_stats(self):
+        """Request, cancellation, short circuit, document sync and process statistics of the server"""
+        return {
+            "methods": self.__comm.get_stats(),
+            "cancelled": self.get_cancel_counts(),
+            "short_circuited": self.__comm.get_short_circuit_count(),
+            "hover_cache": self.hover_cache.get_stats(),
+            "sync": self.get_sync_stats(),
+            "startup_seconds": self.get_startup_time(),
+            "memory_bytes": self.get_memory_usage()
         }
-        req_dict = self.create_req_dict("change", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.postCmd(json_str)
-        if self.__worker_comm.started():
-            self.__worker_comm.postCmd(json_str)
+
+    def get_startup_time(self):
+        """Seconds the server took to answer initialize, None until it has"""
+        return self.__comm.get_startup_time()
 
     def completions(self, path, location=Location(1, 1), prefix="", on_completed=None):
+        """Requests completions and waits for them; returns the seq of the request"""
         args = {"file": path, "line": location.line, "offset": location.offset, "prefix": prefix}
         req_dict = self.create_req_dict("completions", args)
-        json_str = json_helpers.encode(req_dict)
         self.__comm.sendCmd(
-            json_str,
+            req_dict,
             lambda response_dict: None if on_completed is None else on_completed(response_dict),
             req_dict["seq"]
         )
+        return req_dict["seq"]
 
     def async_completions(self, path, location=Location(1, 1), prefix="", on_completed=None):
+        """
+        Requests completions; returns the seq of the request, which is only
+        known after queued changes took theirs, or None if it was not sent
+        """
         args = {"file": path, "line": location.line, "offset": location.offset, "prefix": prefix}
         req_dict = self.create_req_dict("completions", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.sendCmdAsync(json_str, on_completed, req_dict["seq"])
+        self.supersede(req_dict)
+        if self.__comm.sendCmdAsync(req_dict, on_completed, req_dict["seq"]) is None:
+            return None
+        return req_dict["seq"]
+
+    def resolve_completion(self, path, item, on_completed=None):
+        """Asks for the detail and documentation of a completion item of <path>"""
+        args = {"file": path, "item": item}
+        req_dict = self.create_req_dict("completionEntryDetails", args)
+        self.supersede(req_dict)
+        self.__comm.sendCmdAsync(req_dict, on_completed, req_dict["seq"])
 
     def signature_help(self, path, location=Location(1, 1), prefix="", on_completed=None):
         args = {"file": path, "line": location.line, "offset": location.offset, "prefix": prefix}
         req_dict = self.create_req_dict("signatureHelp", args)
-        json_str = json_helpers.encode(req_dict)
         self.__comm.sendCmd(
-            json_str,
+            req_dict,
             lambda response_dict: None if on_completed is None else on_completed(response_dict),
             req_dict["seq"]
         )
@@ -82,14 +204,13 @@ class ServiceProxy:
     def async_signature_help(self, path, location=Location(1, 1), prefix="", on_completed=None):
         args = {"file": path, "line": location.line, "offset": location.offset, "prefix": prefix}
         req_dict = self.create_req_dict("signatureHelp", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.sendCmdAsync(json_str, on_completed, req_dict["seq"])
+        self.supersede(req_dict)
+        self.__comm.sendCmdAsync(req_dict, on_completed, req_dict["seq"])
 
     def definition(self, path, location=Location(1, 1)):
         args = {"file": path, "line": location.line, "offset": location.offset}
         req_dict = self.create_req_dict("definition", args)
-        json_str = json_helpers.encode(req_dict)
-        response_dict = self.__comm.sendCmdSync(json_str, req_dict["seq"])
+        response_dict = self.__comm.sendCmdSync(req_dict, req_dict["seq"])
         return response_dict
 
     def format(self, path, begin_location=Location(1, 1), end_location=Location(1, 1)):
@@ -101,173 +222,198 @@ class ServiceProxy:
             "endOffset": end_location.offset
         }
         req_dict = self.create_req_dict("format", args)
-        json_str = json_helpers.encode(req_dict)
-        response_dict = self.__comm.sendCmdSync(json_str, req_dict["seq"])
+        response_dict = self.__comm.sendCmdSync(req_dict, req_dict["seq"])
         if self.__worker_comm.started():
-            self.__worker_comm.sendCmdSync(json_str, req_dict["seq"])
+            self.__worker_comm.sendCmdSync(req_dict, req_dict["seq"])
         return response_dict
 
     def format_on_key(self, path, location=Location(1, 1), key=""):
         args = {"file": path, "line": location.line, "offset": location.offset, "key": key}
         req_dict = self.create_req_dict("formatonkey", args)
-        json_str = json_helpers.encode(req_dict)
-        response_dict = self.__comm.sendCmdSync(json_str, req_dict["seq"])
+        response_dict = self.__comm.sendCmdSync(req_dict, req_dict["seq"])
         if self.__worker_comm.started():
-            self.__worker_comm.sendCmdSync(json_str, req_dict["seq"])
+            self.__worker_comm.sendCmdSync(req_dict, req_dict["seq"])
         return response_dict
 
-    def open(self, path, contents):
-        args = {"file": path, "text": contents}
-        req_dict = self.create_req_dict("open", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.postCmd(json_str)
-        if self.__worker_comm.started():
-            self.__worker_comm.postCmd(json_str)
+    def open(self, path, contents, version=0):
+        with self.documents.lock:
+            document = self.documents.open(path, contents, version)
+            self.hover_cache.invalidate(path)
+            args = {"file": path, "text": contents, "version": document.version}
+            req_dict = self.create_req_dict("open", args)
+            self.__comm.postCmd(req_dict)
+            if self.__worker_comm.started():
+                self.__worker_comm.postCmd(req_dict)
 
     def open_on_worker(self, path, contents):
-        args = {"file": path, "text": contents}
-        req_dict = self.create_req_dict("open", args)
-        json_str = json_helpers.encode(req_dict)
-        if self.__worker_comm.started():
-            self.__worker_comm.postCmd(json_str)
+        """
+        Opens <path> on the worker with the text and version last sent to the
+        server, so later changes apply to the same text; <contents> is only
+        used for a document the server does not have
+        """
+        # send queued changes first, so the worker starts from the latest text
+        self.flush_changes(path)
+        with self.documents.lock:
+            document = self.documents.get(path)
+            if document:
+                args = {"file": path, "text": document.text, "version": document.version}
+            else:
+                args = {"file": path, "text": contents, "version": 0}
+            req_dict = self.create_req_dict("open", args)
+            if self.__worker_comm.started():
+                self.__worker_comm.postCmd(req_dict)
 
     def close(self, path):
+        self.documents.close(path)
+        self.hover_cache.invalidate(path)
         args = {"file": path}
         req_dict = self.create_req_dict("close", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.postCmd(json_str)
+        self.__comm.postCmd(req_dict)
         if self.__worker_comm.started():
-            self.__worker_comm.postCmd(json_str)
+            self.__worker_comm.postCmd(req_dict)
 
     def references(self, path, location=Location(1, 1), on_completed=None):
         args = {"file": path, "line": location.line, "offset": location.offset}
         req_dict = self.create_req_dict("references", args)
-        json_str = json_helpers.encode(req_dict)
         callback = on_completed or (lambda: None)
         if not IS_ST2:
             self.__comm.sendCmdAsync(
-                json_str,
+                req_dict,
                 callback,
                 req_dict["seq"]
             )
         else:
             self.__comm.sendCmd(
-                json_str,
+                req_dict,
                 callback,
                 req_dict["seq"]
             )
 
-    def reload(self, path, alternate_path):
-        args = {"file": path, "tmpfile": alternate_path}
-        req_dict = self.create_req_dict("reload", args)
-        json_str = json_helpers.encode(req_dict)
-        response_dict = self.__comm.sendCmdSync(json_str, req_dict["seq"])
-        if self.__worker_comm.started():
-            self.__worker_comm.sendCmdSync(json_str, req_dict["seq"])
-        return response_dict
-
-    def reload_on_worker(self, path, alternate_path):
-        args = {"file": path, "tmpfile": alternate_path}
-        req_dict = self.create_req_dict("reload", args)
-        json_str = json_helpers.encode(req_dict)
-        if self.__worker_comm.started():
-            response_dict = self.__worker_comm.sendCmdSync(json_str, req_dict["seq"])
-            return response_dict
-
-    def reload_async(self, path, alternate_path, on_completed):
-        args = {"file": path, "tmpfile": alternate_path}
-        req_dict = self.create_req_dict("reload", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.sendCmdAsync(json_str, on_completed, req_dict["seq"])
-        if self.__worker_comm.started():
-            self.__worker_comm.sendCmdAsync(json_str, None, req_dict["seq"])
-
-    def reload_async_on_worker(self, path, alternate_path, on_completed):
-        args = {"file": path, "tmpfile": alternate_path}
-        req_dict = self.create_req_dict("reload", args)
-        json_str = json_helpers.encode(req_dict)
-        if self.__worker_comm.started():
-            self.__worker_comm.sendCmdAsync(json_str, None, req_dict["seq"])
+    def reload(self, path, contents):
+        """
+        Makes the server copy of <path> match <contents> when the edits that
+        led there are unknown; only the span that differs is sent
+        """
+        self.documents.take_pending(path)
+        self.change(path, contents)
 
     def rename(self, path, location=Location(1, 1)):
         args = {"file": path, "line": location.line, "offset": location.offset}
         req_dict = self.create_req_dict("rename", args)
-        json_str = json_helpers.encode(req_dict)
-        response_dict = self.__comm.sendCmdSync(json_str, req_dict["seq"])
+        response_dict = self.__comm.sendCmdSync(req_dict, req_dict["seq"])
         if self.__worker_comm.started():
-            self.__worker_comm.sendCmdSync(json_str, req_dict["seq"])
+            self.__worker_comm.sendCmdSync(req_dict, req_dict["seq"])
         return response_dict
 
     def request_get_err(self, delay=0, pathList=[]):
         args = {"files": pathList, "delay": delay}
         req_dict = self.create_req_dict("geterr", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.postCmd(json_str)
+        self.__comm.postCmd(req_dict)
 
     def request_get_err_for_project(self, delay=0, path=""):
         args = {"file": path, "delay": delay}
         req_dict = self.create_req_dict("geterrForProject", args)
-        json_str = json_helpers.encode(req_dict)
         if self.__worker_comm.started():
-            self.__worker_comm.postCmd(json_str)
+            self.__worker_comm.postCmd(req_dict)
 
     def type(self, path, location=Location(1, 1)):
         args = {"file": path, "line": location.line, "offset": location.offset}
         req_dict = self.create_req_dict("type", args)
-        json_str = json_helpers.encode(req_dict)
-        response_dict = self.__comm.sendCmdSync(json_str, req_dict["seq"])
+        response_dict = self.__comm.sendCmdSync(req_dict, req_dict["seq"])
         return response_dict
 
-    def quick_info(self, path, location=Location(1, 1), on_completed=None):
+    def quick_info(self, path, location=Location(1, 1), on_completed=None, supersede_kind=None):
+        """
+        Gets the quick info at <location>; answered from the hover cache if an
+        earlier response for the current version of <path> covers <location>.
+        Returns the seq of the request sent, None if answered from the cache.
+
+        The request supersedes the previous one of the same <supersede_kind>,
+        "quickinfo" by default, so hovers and the status bar can use
+        different kinds without cancelling each other.
+        """
         args = {"file": path, "line": location.line, "offset": location.offset}
+        # flushes queued changes, so the version below is the one the server sees
         req_dict = self.create_req_dict("quickinfo", args)
-        json_str = json_helpers.encode(req_dict)
-        callback = on_completed or (lambda: None)
+        on_completed = on_completed or (lambda response: None)
+        document = self.documents.get(path)
+        version = document.version if document else None
+        cached = self.hover_cache.get(path, version, location) if document else None
+        if cached is not None:
+            on_completed(cached)
+            return None
+
+        def callback(response):
+            if document and response["success"] and document.version == version:
+                self.hover_cache.put(path, version, location, response)
+            on_completed(response)
+
         if not IS_ST2:
+            self.supersede(req_dict, supersede_kind)
             self.__comm.sendCmdAsync(
-                json_str,
+                req_dict,
                 callback,
                 req_dict["seq"]
             )
         else:
             self.__comm.sendCmd(
-                json_str,
+                req_dict,
                 callback,
                 req_dict["seq"]
             )
+        return req_dict["seq"]
 
     def get_event(self):
-        event_json_str = self.__comm.getEvent()
-        return json_helpers.decode(event_json_str) if event_json_str is not None else None
+        return self.__comm.getEvent()
 
     def get_event_from_worker(self):
-        event_json_str = self.__worker_comm.getEvent()
-        return json_helpers.decode(event_json_str) if event_json_str is not None else None
+        return self.__worker_comm.getEvent()
 
     def save_to(self, path, alternatePath):
         args = {"file": path, "tmpfile": alternatePath}
         req_dict = self.create_req_dict("saveto", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.postCmd(json_str)
+        self.__comm.postCmd(req_dict)
 
     def nav_to(self, search_text, file_name):
         args = {"searchValue": search_text, "file": file_name, "maxResultCount": 20}
         req_dict = self.create_req_dict("navto", args)
-        json_str = json_helpers.encode(req_dict)
-        response_dict = self.__comm.sendCmdSync(json_str, req_dict["seq"])
+        response_dict = self.__comm.sendCmdSync(req_dict, req_dict["seq"])
         return response_dict
 
     def project_info(self, file_name, need_file_name_list=False):
         args = {"file": file_name, "needFileNameList": need_file_name_list}
         req_dict = self.create_req_dict("projectInfo", args)
-        json_str = json_helpers.encode(req_dict)
-        return self.__comm.sendCmdSync(json_str, req_dict["seq"])
+        return self.__comm.sendCmdSync(req_dict, req_dict["seq"])
 
     def async_document_highlights(self, path, location, on_completed=None):
         args = {"line": location.line, "offset": location.offset, "file": path, "filesToSearch": [path]}
         req_dict = self.create_req_dict("documentHighlights", args)
-        json_str = json_helpers.encode(req_dict)
-        self.__comm.sendCmdAsync(json_str, on_completed, req_dict["seq"])
+        self.supersede(req_dict)
+        self.__comm.sendCmdAsync(req_dict, on_completed, req_dict["seq"])
+
+    def cancel(self, seq):
+        """Cancels an in-flight request; its callback will not be called"""
+        return self.__comm.cancel(seq)
+
+    def supersede(self, req_dict, kind=None):
+        """
+        Records <req_dict> as the latest request of its <kind>, its command by
+        default, for its file and cancels the previous one, whose answer would
+        be thrown away anyway
+        """
+        command = req_dict["command"]
+        key = (kind or command, req_dict["arguments"]["file"])
+        with self.seq_lock:
+            previous_seq = self.latest_requests.get(key)
+            self.latest_requests[key] = req_dict["seq"]
+        if previous_seq is not None and self.__comm.cancel(previous_seq):
+            with self.seq_lock:
+                self.cancel_counts[command] = self.cancel_counts.get(command, 0) + 1
+
+    def get_cancel_counts(self):
+        """Number of superseded requests cancelled, per command"""
+        with self.seq_lock:
+            return dict(self.cancel_counts)
 
     def add_event_handler(self, event_name, cb):
         self.__comm.add_event_handler(event_name, cb)
@@ -275,7 +421,25 @@ class ServiceProxy:
     def add_event_handler_for_worker(self, event_name, cb):
         self.__worker_comm.add_event_handler(event_name, cb)
 
+    def adopt_event_handlers(self, other):
+        """
+        Registers on this (new) server and worker the event handlers of
+        <other>; listeners register theirs only once per plugin load
+        """
+        for event_name, callbacks in other.__comm.get_event_handlers().items():
+            for cb in callbacks:
+                self.add_event_handler(event_name, cb)
+        for event_name, callbacks in other.__worker_comm.get_event_handlers().items():
+            for cb in callbacks:
+                self.add_event_handler_for_worker(event_name, cb)
+
     def create_req_dict(self, command_name, args=None):
+        if args and command_name not in SYNC_COMMANDS:
+            # sync barrier: the server must see queued edits before the request
+            if "file" in args:
+                self.flush_changes(args["file"])
+            for path in args.get("files", []):
+                self.flush_changes(path)
         req_dict = {
             "command": command_name,
             "seq": self.increase_seq(),
@@ -0,0 +1,82 @@
+import collections
+import sys
+import threading
+import time
+
+# lines of server stderr kept in memory per server
+DEFAULT_MAX_LINES = 1000
+# lines per second forwarded to the console, 0 to forward nothing
+DEFAULT_CONSOLE_RATE = 10
+# size of a single read from the stderr pipe
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class StderrBuffer(object):
+    """
+    Keeps the last lines a server wrote to stderr and forwards a limited
+    number of them per second to the console; the rest are only counted
+    """
+
+    def __init__(self, name, max_lines=DEFAULT_MAX_LINES, console_rate=DEFAULT_CONSOLE_RATE):
+        self.name = name
+        self.lines = collections.deque(maxlen=max_lines)
+        self.lock = threading.Lock()
+        self.console_rate = console_rate
+        # incomplete last line of the previous chunk
+        self.partial = b""
+        # console budget of the current one-second window
+        self.window_start = 0
+        self.window_count = 0
+        self.suppressed_count = 0
+        self.total_lines = 0
+
+    def feed(self, data):
+        """Adds a chunk of raw stderr output"""
+        chunks = (self.partial + data).split(b"\n")
+        self.partial = chunks.pop()
+        lines = [chunk.decode("utf-8", "replace").rstrip("\r") for chunk in chunks]
+        with self.lock:
+            self.lines.extend(lines)
+            self.total_lines += len(lines)
+        self.forward(lines)
+
+    def close(self):
+        """Flushes a last line that had no line break"""
+        if self.partial:
+            self.feed(b"\n")
+
+    def forward(self, lines):
+        if self.console_rate <= 0 or not lines:
+            return
+        now = time.time()
+        if now - self.window_start >= 1:
+            if self.suppressed_count:
+                print("{0}> ... {1} line(s) not shown".format(self.name, self.suppressed_count), file=sys.stderr)
+                self.suppressed_count = 0
+            self.window_start = now
+            self.window_count = 0
+        shown = lines[:max(self.console_rate - self.window_count, 0)]
+        self.window_count += len(shown)
+        self.suppressed_count += len(lines) - len(shown)
+        for line in shown:
+            print("{0}> {1}".format(self.name, line), file=sys.stderr)
+
+    def tail(self, count):
+        """The last <count> lines"""
+        with self.lock:
+            lines = list(self.lines)
+        return lines[-count:] if count > 0 else []
+
+    def pump(self, stream):
+        """Reads <stream> in large chunks until it closes; runs on its own thread"""
+        read = getattr(stream, "read1", stream.read)
+        try:
+            while True:
+                data = read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                self.feed(data)
+        except (IOError, OSError, ValueError):
+            # the pipe was closed under us
+            pass
+        self.close()
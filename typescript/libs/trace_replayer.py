@@ -0,0 +1,137 @@
+"""
+Replays a trace written by traffic_trace through a real LspCommClient.
+
+Outgoing frames of the trace are issued through the client again, requests
+with their original ids; incoming frames are written into a pipe that the
+client reads as if it were the stdout of a server. Only the server is
+simulated, so a replay measures the client side of the pipeline: framing,
+decoding, response conversion and request bookkeeping.
+"""
+
+import json
+import os
+import threading
+import time
+
+from . import lsp_helpers
+from .frame_reader import FrameReader
+from .logger import log
+from .lsp_client import LspCommClient
+from .traffic_trace import read_trace, OUTGOING
+
+# seconds to wait for the response to a replayed request
+REPLAY_TIMEOUT = 30
+
+# time.monotonic is not available before Python 3.3
+_clock = getattr(time, "monotonic", time.time)
+
+
+class ReplayProcess(object):
+    """
+    Stands in for a server process: stdout is fed from the trace and
+    whatever the client writes to stdin is discarded
+    """
+
+    def __init__(self):
+        stdout_read, stdout_write = os.pipe()
+        stdin_read, stdin_write = os.pipe()
+        self.stdout = os.fdopen(stdout_read, "rb")
+        self.stdin = os.fdopen(stdin_write, "wb")
+        self.server_stdout = os.fdopen(stdout_write, "wb")
+        self.pid = os.getpid()
+        self.returncode = None
+        drain = threading.Thread(target=ReplayProcess.__drain, args=(os.fdopen(stdin_read, "rb"),))
+        drain.daemon = True
+        drain.start()
+
+    @staticmethod
+    def __drain(stream):
+        with stream:
+            while stream.read(64 * 1024):
+                pass
+
+    def send(self, body):
+        """Writes a frame as if the server had sent it"""
+        self.server_stdout.write(lsp_helpers.frame_body(body))
+        self.server_stdout.flush()
+
+    def close(self):
+        """Ends the server output; the client sees the server exit"""
+        self.server_stdout.close()
+        self.stdin.close()
+        self.returncode = 0
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None:
+            self.close()
+
+
+def replay_trace(path, realtime=True):
+    """
+    Replays the trace at <path>, keeping the original timing between frames
+    if <realtime> is set and as fast as possible otherwise
+
+    Returns a dict of statistics about the replay.
+    """
+    client = LspCommClient("lsp-replay", [], {"PATH": ""}, None)
+    proc = ReplayProcess()
+    client.server_proc = proc
+
+    def read():
+        reader = FrameReader(proc.stdout)
+        while not LspCommClient.read_msg(reader, client.pending, client.eventq, proc, client.event_handlers,
+                                         stats=client.stats):
+            pass
+
+    reader_thread = threading.Thread(target=read)
+    reader_thread.daemon = True
+    reader_thread.start()
+
+    futures = []
+    counts = {"outgoing": 0, "incoming": 0, "outgoing_bytes": 0, "incoming_bytes": 0}
+    trace_duration = 0
+    start = _clock()
+    for timestamp, direction, body in read_trace(path):
+        trace_duration = timestamp
+        if realtime:
+            delay = timestamp - (_clock() - start)
+            if delay > 0:
+                time.sleep(delay)
+        if direction == OUTGOING:
+            counts["outgoing"] += 1
+            counts["outgoing_bytes"] += len(body)
+            message = json.loads(body.decode("utf-8"))
+            if "id" in message and "method" in message:
+                future = client.request(message, REPLAY_TIMEOUT)
+                if future:
+                    futures.append(future)
+            else:
+                # notifications, and answers to requests from the server
+                client.write(message)
+        else:
+            counts["incoming"] += 1
+            counts["incoming_bytes"] += len(body)
+            proc.send(body)
+    proc.close()
+    reader_thread.join(REPLAY_TIMEOUT)
+    elapsed = _clock() - start
+
+    latencies = sorted((future.done_time - future.sent_time) * 1000 for future in futures if future.done_time)
+    stats = {
+        "trace": path,
+        "realtime": realtime,
+        "trace_seconds": trace_duration,
+        "replay_seconds": elapsed,
+        "requests": len(futures),
+        "unanswered": len(futures) - len(latencies)
+    }
+    stats.update(counts)
+    if latencies:
+        stats["latency_p50_ms"] = latencies[len(latencies) // 2]
+        stats["latency_max_ms"] = latencies[-1]
+    stats["methods"] = client.get_stats()
+    log.info('Replayed %s: %s', path, stats)
+    return stats
@@ -0,0 +1,91 @@
+"""
+Records the JSON-RPC traffic between the plugin and a language server.
+
+A trace file starts with TRACE_MAGIC, followed by one record per frame: a
+RECORD_HEADER (seconds since the recording started, direction byte, body
+length) and the raw UTF-8 body of the frame. Bodies are stored as sent or
+received, so a trace can be replayed byte for byte; see trace_replayer.
+"""
+
+import os
+import struct
+import threading
+import time
+
+from .logger import log
+
+TRACE_MAGIC = b"LSPTRACE1\n"
+# little-endian double timestamp, direction byte, uint32 body length
+RECORD_HEADER = struct.Struct("<dcI")
+# direction of a frame
+OUTGOING = b">"
+INCOMING = b"<"
+TRACE_EXTENSION = ".lsptrace"
+
+# time.monotonic is not available before Python 3.3
+_clock = getattr(time, "monotonic", time.time)
+
+
+class TrafficRecorder(object):
+    """Appends frames to a trace file while recording is on; a no-op otherwise"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file = None
+        self.path = None
+        self.start_time = 0
+        self.frame_count = 0
+
+    def is_recording(self):
+        return self.file is not None
+
+    def start(self, path):
+        with self.lock:
+            if self.file:
+                self.file.close()
+            self.file = open(path, "wb")
+            self.file.write(TRACE_MAGIC)
+            self.path = path
+            self.start_time = _clock()
+            self.frame_count = 0
+        log.info('Recording LSP traffic to %s', path)
+
+    def stop(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                log.info('Recorded %s frame(s) to %s', self.frame_count, self.path)
+            self.file = None
+
+    def record(self, direction, body):
+        if self.file is None:
+            return
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(RECORD_HEADER.pack(_clock() - self.start_time, direction, len(body)))
+            self.file.write(body)
+            self.frame_count += 1
+
+
+def trace_path(directory, name, pid):
+    """A new trace file name in <directory> for server <name> with process id <pid>"""
+    file_name = "{0}-{1}-{2}{3}".format(name, pid, time.strftime("%Y%m%d-%H%M%S"), TRACE_EXTENSION)
+    return os.path.join(directory, file_name)
+
+
+def read_trace(path):
+    """Yields the (timestamp, direction, body) records of a trace file"""
+    with open(path, "rb") as trace:
+        if trace.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError("{0} is not an LSP trace".format(path))
+        while True:
+            header = trace.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, direction, length = RECORD_HEADER.unpack(header)
+            body = trace.read(length)
+            if len(body) < length:
+                log.warning('Trace %s is truncated', path)
+                return
+            yield timestamp, direction, body
@@ -1,5 +1,3 @@
-import codecs
-
 from .global_vars import *
 from .editor_client import cli
 from .text_helpers import *
@@ -75,8 +73,6 @@ def get_info(view, open_if_not_cached=True):
                         if not info_on_worker:
                             _file_map_on_worker[file_name] = info
                             open_file_on_worker(view)
-                            if view.is_dirty() and not view.is_loading():
-                                reload_buffer_on_worker(view)
                     else:
                         _file_map_on_worker.clear()
     return info
@@ -207,38 +203,9 @@ def set_caret_pos(view, pos):
     view.sel().add(pos)
 
 
-def get_tempfile_name():
-    """Get the first unused temp file name to avoid conflicts"""
-    service = cli.get_service()
-    if not service:
-        return None
-    seq = service.seq
-    if len(cli.available_tempfile_list) > 0:
-        tempfile_name = cli.available_tempfile_list.pop()
-    else:
-        tempfile_name = os.path.join(PLUGIN_DIR, ".tmpbuf" + str(cli.tmpseq))
-        cli.tmpseq += 1
-    cli.seq_to_tempfile_name[seq] = tempfile_name
-    return tempfile_name
-
-
-def recv_reload_response(reload_resp):
-    """Post process after receiving a reload response"""
-    if reload_resp["request_seq"] in cli.seq_to_tempfile_name:
-        tempfile_name = cli.seq_to_tempfile_name.pop(reload_resp["request_seq"])
-        if tempfile_name:
-            cli.available_tempfile_list.append(tempfile_name)
-
-
 def reload_buffer(view, client_info=None):
-    """Write the buffer of view to a temporary file and have the server reload it"""
+    """Send the whole buffer of view to the server, which diffs it against the last text sent"""
     if not view.is_loading():
-        tmpfile_name = get_tempfile_name()
-        tmpfile = codecs.open(tmpfile_name, "w", "utf-8")
-        text = view.substr(sublime.Region(0, view.size()))
-        tmpfile.write(text)
-        tmpfile.flush()
-
         if not client_info:
             client_info = cli.get_or_add_file(view.file_name())
 
@@ -246,36 +213,14 @@ def reload_buffer(view, client_info=None):
         if not service:
             return None
 
+        service.reload(view.file_name(), view.substr(sublime.Region(0, view.size())))
         if not IS_ST2:
-            service.reload_async(view.file_name(), tmpfile_name, recv_reload_response)
             client_info.change_count = view.change_count()
         else:
-            # Sublime 2 doesn't have good support for multi threading
-            reload_response = service.reload(view.file_name(), tmpfile_name)
-            recv_reload_response(reload_response)
             info = get_info(view)
             client_info.change_count = info.modify_count
         client_info.pending_changes = False
 
-def reload_buffer_on_worker(view):
-    """Reload the buffer content on the worker process
-
-    Note: the worker process won't change the client_info object to avoid synchronization issues
-    """
-    if not view.is_loading():
-        service = cli.get_service()
-        if not service:
-            return None
-        tmpfile_name = get_tempfile_name()
-        tmpfile = codecs.open(tmpfile_name, "w", "utf-8")
-        text = view.substr(sublime.Region(0, view.size()))
-        tmpfile.write(text)
-        tmpfile.flush()
-        if not IS_ST2:
-            service.reload_async_on_worker(view.file_name(), tmpfile_name, recv_reload_response)
-        else:
-            reload_response = service.reload_on_worker(view.file_name(), tmpfile_name)
-            recv_reload_response(reload_response)
 
 def reload_required(view):
     client_info = cli.get_or_add_file(view.file_name())
@@ -286,7 +231,7 @@ def check_update_view(view):
     """Check if the buffer in the view needs to be reloaded
 
     If we have changes to the view not accounted for by change messages, 
-    send the whole buffer through a temporary file
+    send the whole buffer
     """
     if is_supported_ext(view):
         client_info = cli.get_or_add_file(view.file_name())
@@ -298,18 +243,26 @@ def send_replace_changes_for_regions(view, regions, insert_string):
     """
     Given a list of regions and a (possibly zero-length) string to insert, 
     send the appropriate change information to the server.
+
+    The change is queued and coalesced with the following ones. The regions
+    are only trusted if replacing them turns the text last sent into the
+    current buffer; otherwise (or without regions) the change is found by
+    diffing the two.
     """
     if not is_supported_ext(view):
         return
     service = cli.get_service()
     if not service:
         return None
-    service.change(view.file_name(), None, None, view.substr(sublime.Region(0, view.size())))
-    # TODO: In partial update world, bottom code should be used
-    # for region in regions:
-    #     location = get_location_from_position(view, region.begin())
-    #     end_location = get_location_from_position(view, region.end())
-    #     service.change(view.file_name(), location, end_location, view.substr(sublime.Region(0, view.size())))
+    edits = None
+    if regions:
+        edits = [(region.begin(), region.end(), insert_string) for region in regions]
+    service.queue_change(
+        view.file_name(),
+        lambda: view.substr(sublime.Region(0, view.size())),
+        edits,
+        view.change_count() if not IS_ST2 else None
+    )
 
 
 def apply_edit(text, view, start_line, start_offset, end_line, end_offset, new_text=""):
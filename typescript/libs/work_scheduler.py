@@ -102,7 +102,7 @@ class WorkScheduler():
                 self.last_cost = end_time - self.last_time
                 self.job_running = False
                 canceled = self.canceled
-            log.debug('Work took {0:d}ms'.format(int(self.last_cost * 1000)))
+            log.debug('Work took %dms', int(self.last_cost * 1000))
             if not canceled:
                 # Post the response to the handler on the main thread
                 sublime.set_timeout(lambda: handler(results), 0)
@@ -178,7 +178,7 @@ class WorkScheduler():
             delta_ms = max(33, delta_ms)
             delta_ms = min(500, delta_ms)
             # Run whatever is the 'next_job' when scheduler is due
-            log.debug('Scheduling job for {0}ms'.format(delta_ms))
+            log.debug('Scheduling job for %sms', delta_ms)
             sublime.set_timeout(on_scheduled, delta_ms)
         else:
             log.debug('Job already scheduled')
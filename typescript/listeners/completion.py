@@ -1,9 +1,17 @@
 ﻿import sublime
+import time
 
 from ..libs.view_helpers import *
 from ..libs.text_helpers import *
+from ..libs.completion_cache import CompletionCache, PopupStats, completion_anchor, rank_completions, DEFAULT_MAX_ITEMS
+from ..libs.identifier_index import IdentifierIndex
+from ..libs.logger import log
 from .event_hub import EventHub
 
+# milliseconds the server gets to answer before local identifiers are offered,
+# unless "completion_latency_budget_ms" is set
+COMPLETION_LATENCY_BUDGET = 300
+
 
 class CompletionEventListener:
     def __init__(self):
@@ -13,6 +21,27 @@ class CompletionEventListener:
         self.completion_request_seq = None
         self.completion_request_prefix = None
         self.completion_request_loc = None
+        self.completion_request_anchor = None
+        # last complete list from the server, refiltered as the word grows
+        self.completion_cache = CompletionCache()
+        self.popup_stats = PopupStats()
+        # entries of the last popup by name, and the one last resolved
+        self.shown_entries = {}
+        self.resolved_entry = None
+        # completion request started when a trigger character was typed
+        self.prefetch_anchor = None
+        self.prefetch_seq = None
+        self.prefetch_adopted = False
+        # anchor of a prefetched list in the cache that was not shown yet
+        self.prefetched_anchor = None
+        self.prefetch_count = 0
+        self.prefetch_used = 0
+        # the last completion request is unanswered, and past its latency budget
+        self.completion_request_pending = False
+        self.completion_deadline_passed = False
+        # identifiers of the open documents, offered while the server is slow
+        self.identifier_index = IdentifierIndex()
+        self.local_fallbacks = 0
         self.if_completion_request_member = False
         self.pending_completions = []
         self.modified = False
@@ -21,6 +50,10 @@ class CompletionEventListener:
         info.last_completion_loc = None
         # save cursor in case we need to read what was inserted
         info.prev_sel = regions_to_static_regions(view.sel())
+        self.identifier_index.schedule(view, change_count(view))
+
+    def on_close(self, view):
+        self.identifier_index.remove(view.file_name())
 
     def on_text_command_with_info(self, view, command_name, args, info):
         if command_name in ["commit_completion", "insert_best_completion"]:
@@ -44,6 +77,10 @@ class CompletionEventListener:
         self.modified = False
 
     def on_post_text_command_with_info(self, view, command_name, args, info):
+        if command_name in ["commit_completion", "insert_best_completion"] and len(view.sel()) == 1:
+            committed = self.shown_entries.get(view.substr(view.word(view.sel()[0].begin())))
+            if committed:
+                self.resolve_completion(view, committed)
         if not info.change_sent and info.modified:
             # file is modified but on_text_command and on_modified did not
             # handle it
@@ -86,36 +123,140 @@ class CompletionEventListener:
             if not IS_ST2:
                 view.add_regions("apresComp", decrease_locs_to_regions(locations, 0), flags=sublime.HIDDEN)
 
+            anchor = completion_anchor(view, locations[0], prefix)
+            if not self.completions_ready:
+                cached = self.completion_cache.get(anchor, prefix)
+                if cached is not None:
+                    if anchor == self.prefetched_anchor:
+                        self.prefetch_used += 1
+                        self.prefetched_anchor = None
+                    info.last_completion_loc = locations[0]
+                    completions = self.prepare_completions(view, cached, prefix)
+                    return completions, sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_EXPLICIT_COMPLETIONS
+
             if (not self.completions_ready) or IS_ST2:
                 location = get_location_from_position(view, locations[0])
                 check_update_view(view)
                 if IS_ST2:
                     # Send synchronous request for Sublime Text 2
+                    self.completion_request_anchor = anchor
+                    self.completion_request_prefix = prefix
                     service.completions(view.file_name(), location, prefix, self.handle_completion_info)
+                elif self.adopt_prefetch(anchor, locations[0] - len(prefix)):
+                    # the prefetched list is on its way and shows up like an answer to this query
+                    self.start_deadline(view, self.completion_request_seq)
+                elif self.completion_request_pending and anchor == self.completion_request_anchor \
+                        and prefix.startswith(self.completion_request_prefix):
+                    # the list for this word is still on its way
+                    pass
                 else:
                     # Send asynchronous request for Sublime Text 3
                     # 'locations' is an array because of multiple cursor support
-                    self.completion_request_loc = locations[0]
+                    self.completion_request_anchor = anchor
                     self.completion_request_prefix = prefix
-                    self.completion_request_seq = service.seq
+                    self.completion_request_loc = locations[0]
                     if locations[0] > 0:
                         prev_char = view.substr(sublime.Region(locations[0] - 1, locations[0] - 1))
                         self.if_completion_request_member = (prev_char == ".")
                     else:
                         self.if_completion_request_member = False
-                    service.async_completions(view.file_name(), location, prefix, self.handle_completion_info)
+                    self.completion_deadline_passed = False
+                    self.completion_request_seq = service.async_completions(
+                        view.file_name(), location, prefix, self.on_completion_response)
+                    self.completion_request_pending = self.completion_request_seq is not None
+                    if self.completion_request_pending:
+                        self.start_deadline(view, self.completion_request_seq)
 
             completions = self.pending_completions
+            if not completions and self.completion_request_pending and self.completion_deadline_passed:
+                # the server is slow; offer the identifiers of the open documents meanwhile
+                completions = self.local_completions(prefix)
             info.last_completion_loc = locations[0]
             self.pending_completions = []
             self.completions_ready = False
             return completions, sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_EXPLICIT_COMPLETIONS
 
+    def post_on_modified(self, view):
+        """
+        Starts a completion request as soon as a trigger character is typed,
+        so that the list is usually there when Sublime asks for it
+        """
+        if is_supported_ext(view):
+            self.identifier_index.schedule(view, change_count(view))
+        if IS_ST2 or len(view.sel()) != 1 or not view.sel()[0].empty():
+            return
+        location = view.sel()[0].begin()
+        if location == 0 or view.command_history(0)[0] != "insert" or not is_supported_ext(view):
+            return
+        service = cli.get_service()
+        if not service or view.substr(location - 1) not in self.trigger_characters(view, service, location):
+            return
+        anchor = completion_anchor(view, location, "")
+        self.prefetch_anchor = anchor
+        self.prefetch_adopted = False
+        self.prefetch_count += 1
+        # the edit that typed the trigger is still queued and takes a seq of
+        # its own before the request is sent
+        self.prefetch_seq = service.async_completions(
+            view.file_name(), get_location_from_position(view, location), "",
+            lambda response: sublime.set_timeout(lambda: self.handle_prefetch(anchor, response), 0))
+        if self.prefetch_seq is None:
+            self.prefetch_anchor = None
+
+    def trigger_characters(self, view, service, location):
+        """The characters of the server and of "auto_complete_triggers" that open completions at <location>"""
+        characters = "".join(service.get_completion_triggers())
+        for trigger in view.settings().get("auto_complete_triggers") or []:
+            if view.match_selector(location, trigger.get("selector", "")):
+                characters += trigger.get("characters", "")
+        return characters
+
+    def adopt_prefetch(self, anchor, start):
+        """
+        Lets the prefetch for <anchor>, if it is still in flight, answer the
+        query for the word starting at <start>
+        """
+        if self.prefetch_anchor is None or anchor != self.prefetch_anchor:
+            return False
+        self.prefetch_adopted = True
+        self.prefetch_used += 1
+        self.completion_request_pending = True
+        self.completion_deadline_passed = False
+        self.completion_request_anchor = anchor
+        self.completion_request_prefix = ""
+        self.completion_request_loc = start
+        self.completion_request_seq = self.prefetch_seq
+        self.if_completion_request_member = anchor[2] == "."
+        return True
+
+    def handle_prefetch(self, anchor, completions_resp):
+        """Caches a prefetched list, or shows it if a query adopted it meanwhile"""
+        if anchor != self.prefetch_anchor:
+            # superseded by a later prefetch
+            return
+        self.prefetch_anchor = None
+        if self.prefetch_adopted:
+            self.handle_completion_info(completions_resp)
+        elif completions_resp["success"]:
+            self.completion_cache.put(anchor, "", completions_resp["body"] or [],
+                                      completions_resp.get("isIncomplete", False))
+            self.prefetched_anchor = anchor
+
+    def on_completion_response(self, completions_resp):
+        """
+        Handles the response on the UI thread, after the request that is
+        answered has recorded its seq
+        """
+        sublime.set_timeout(lambda: self.handle_completion_info(completions_resp), 0)
+
     def handle_completion_info(self, completions_resp):
         """Helper callback when completion info received from server"""
+        if completions_resp["request_seq"] == self.completion_request_seq:
+            self.completion_request_pending = False
         self.pending_completions = []
+        view = active_view()
+        cur_str = self.completion_request_prefix
         if not IS_ST2:
-            view = active_view()
             loc = view.sel()[0].begin()
             prefix_length = len(self.completion_request_prefix)
             # Get the current content from the starting location to the cursor location
@@ -131,19 +272,82 @@ class CompletionEventListener:
                 return
 
         if completions_resp["success"] and (completions_resp["request_seq"] == self.completion_request_seq or IS_ST2):
-            completions = []
-            raw_completions = completions_resp["body"]
-            if raw_completions:
-                for raw_completion in raw_completions:
-                    name = raw_completion["name"]
-                    completion = (name + "\t" + raw_completion["kind"], name.replace("$", "\\$"))
-                    completions.append(completion)
-                self.pending_completions = completions
+            entries = completions_resp["body"] or []
+            self.completion_cache.put(
+                self.completion_request_anchor,
+                self.completion_request_prefix,
+                entries,
+                completions_resp.get("isIncomplete", False))
+            if entries:
+                self.pending_completions = self.prepare_completions(view, entries, cur_str)
             if not IS_ST2:
                 self.completions_ready = True
                 active_view().run_command('hide_auto_complete')
                 self.run_auto_complete()
 
+    def start_deadline(self, view, seq):
+        """Offers local completions if request <seq> is not answered within the latency budget"""
+        budget = sublime.load_settings("SublimeLsp.sublime-settings").get(
+            "completion_latency_budget_ms", COMPLETION_LATENCY_BUDGET)
+        if budget is not None and budget >= 0:
+            sublime.set_timeout(lambda: self.on_completion_deadline(view, seq), budget)
+
+    def on_completion_deadline(self, view, seq):
+        if seq != self.completion_request_seq or not self.completion_request_pending:
+            return
+        self.completion_deadline_passed = True
+        start = self.completion_request_loc - len(self.completion_request_prefix)
+        cursor = view.sel()[0].begin()
+        if cursor < start:
+            return
+        completions = self.local_completions(view.substr(sublime.Region(start, cursor)))
+        if completions:
+            log.debug('Completion request %s is over budget, offering %s local identifier(s)', seq, len(completions))
+            self.local_fallbacks += 1
+            self.pending_completions = completions
+            self.completions_ready = True
+            view.run_command('hide_auto_complete')
+            self.run_auto_complete()
+
+    def local_completions(self, prefix):
+        """Completions for <prefix> from the identifiers of the open documents"""
+        limit = sublime.load_settings("SublimeLsp.sublime-settings").get("completion_max_items", DEFAULT_MAX_ITEMS)
+        return [(name + "\tlocal", name.replace("$", "\\$"))
+                for name in self.identifier_index.candidates(prefix, limit)]
+
+    def prepare_completions(self, view, entries, prefix):
+        """
+        Ranks the completion <entries> for <prefix>, converts the best of them
+        for the popup and resolves the details of the first one
+        """
+        start = time.time()
+        settings = sublime.load_settings("SublimeLsp.sublime-settings")
+        shown = rank_completions(entries, prefix, settings.get("completion_max_items", DEFAULT_MAX_ITEMS))
+        completions = [(entry["name"] + "\t" + entry["kind"], entry["name"].replace("$", "\\$")) for entry in shown]
+        self.shown_entries = dict((entry["name"], entry) for entry in shown)
+        self.popup_stats.record(len(entries), len(shown), time.time() - start)
+        if shown:
+            self.resolve_completion(view, shown[0])
+        return completions
+
+    def resolve_completion(self, view, entry):
+        """Shows the detail and documentation of the completion <entry> in the status bar"""
+        if entry is self.resolved_entry or "item" not in entry:
+            return
+        service = cli.get_service()
+        if not service:
+            return
+        self.resolved_entry = entry
+
+        def on_resolved(response):
+            if response["success"]:
+                body = response["body"]
+                documentation = body["documentation"].strip().split("\n")[0]
+                view.set_status("typescript_info", " ".join(
+                    part for part in (body["name"], body["detail"], documentation) if part))
+
+        service.resolve_completion(view.file_name(), entry["item"], on_resolved)
+
     def run_auto_complete(self):
         active_view().run_command("auto_complete", {
             'disable_auto_insert': True,
@@ -158,4 +362,6 @@ EventHub.subscribe("on_activated_with_info", listener.on_activated_with_info)
 EventHub.subscribe("on_text_command_with_info", listener.on_text_command_with_info)
 EventHub.subscribe("on_modified_with_info", listener.on_modified_with_info)
 EventHub.subscribe("on_selection_modified_with_info", listener.on_selection_modified_with_info)
-EventHub.subscribe("on_post_text_command_with_info", listener.on_post_text_command_with_info)
\ No newline at end of file
+EventHub.subscribe("on_post_text_command_with_info", listener.on_post_text_command_with_info)
+EventHub.subscribe("post_on_modified", listener.post_on_modified)
+EventHub.subscribe("on_close", listener.on_close)
\ No newline at end of file
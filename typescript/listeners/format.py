@@ -25,8 +25,8 @@ class FormatEventListener:
         ):
             last_command, args, repeat_times = view.command_history(0)
             redo_command = view.command_history(1)[0]
-            log.debug("last_command:{0}, args:{1}".format(last_command, args))
-            log.debug("redo_command:{0}".format(redo_command))
+            log.debug("last_command:%s, args:%s", last_command, args)
+            log.debug("redo_command:%s", redo_command)
             if redo_command != "" and redo_command is not None:
                 # in an undo session, avoid running format_on_key. For
                 # a non-undo session in ST3, the redo_command is an empty 
@@ -41,7 +41,7 @@ class FormatEventListener:
                     if cli.auto_match_enabled:
                         prev_char = view.substr(pos - 1)
                         post_char = view.substr(pos + 1)
-                        log.debug("prev_char: {0}, post_char: {1}".format(prev_char, post_char))
+                        log.debug("prev_char: %s, post_char: %s", prev_char, post_char)
                         if prev_char != "{" and post_char != "}":
                             view.run_command("typescript_format_on_key", {"key": "}"})
                     else:
@@ -19,6 +19,9 @@ class TypeScriptEventListener(sublime_plugin.EventListener):
         if TypeScriptEventListener.about_to_close_all:
             return
 
+        # picks up windows and projects opened after the plugin loaded
+        cli.prewarm_window(view.window())
+
         if is_special_view(view):
             self.on_activated_special_view(view)
         else:
@@ -82,7 +85,7 @@ class TypeScriptEventListener(sublime_plugin.EventListener):
                     prev_cursor = info.prev_sel[0].begin()
                     cursor = view.sel()[0].begin()
                     key = view.substr(sublime.Region(prev_cursor, cursor))
-                    # send_replace_changes_for_regions(view, static_regions_to_regions(info.prev_sel), key)
+                    send_replace_changes_for_regions(view, static_regions_to_regions(info.prev_sel), key)
                     # mark change as handled so that on_post_text_command doesn't try to handle it
                     info.change_sent = True
                 else:
@@ -247,6 +250,7 @@ class TypeScriptEventListener(sublime_plugin.EventListener):
 
     def on_close(self, view):
         log.debug("on_close")
+        EventHub.run_listeners("on_close", view)
         file_name = view.file_name()
         info = get_info(view, open_if_not_cached=False)
         if info:
@@ -16,8 +16,8 @@ class NavToEventListener:
             TypescriptNavToCommand.insert_text_finished = True
 
     def on_modified_special_view(self, view):
-        logger.log.debug("enter on_modified: special view. started: %s, insert_text_finished: %s" %
-                         (TypescriptNavToCommand.nav_to_panel_started, TypescriptNavToCommand.insert_text_finished))
+        logger.log.debug("enter on_modified: special view. started: %s, insert_text_finished: %s",
+                         TypescriptNavToCommand.nav_to_panel_started, TypescriptNavToCommand.insert_text_finished)
 
         if TypescriptNavToCommand.nav_to_panel_started and TypescriptNavToCommand.insert_text_finished:
             new_content = view.substr(sublime.Region(0, view.size()))
@@ -26,8 +26,8 @@ class NavToEventListener:
                 lambda: active_window().run_command("typescript_nav_to", {'input_text': new_content}),
                 0)
 
-        logger.log.debug("exit on_modified: special view. started: %s, insert_text_finished: %s" %
-                         (TypescriptNavToCommand.nav_to_panel_started, TypescriptNavToCommand.insert_text_finished))
+        logger.log.debug("exit on_modified: special view. started: %s, insert_text_finished: %s",
+                         TypescriptNavToCommand.nav_to_panel_started, TypescriptNavToCommand.insert_text_finished)
 
 listener = NavToEventListener()
 EventHub.subscribe("on_activated_special_view", listener.on_activated_special_view)
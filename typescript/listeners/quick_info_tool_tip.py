@@ -1,11 +1,116 @@
+import sublime
+
 from .event_hub import EventHub
 from ..libs.view_helpers import *
 from ..libs.logger import log
 from ..libs import cli
 
+# milliseconds the pointer has to rest on a word before its quick info is
+# requested, unless "hover_dwell_ms" is set
+HOVER_DWELL_MS = 150
+# hover requests supersede only each other, not the quick info of the status bar
+HOVER_SUPERSEDE_KIND = "hover"
+
+
 class QuickInfoToolTipEventListener:
+    """
+    Shows quick info for the word under the pointer once the pointer rests
+    on it. Hovers over other words in the meantime restart the wait and
+    cancel a request that is still in flight; answers for a word the pointer
+    has left are dropped. Leaving the text area, or the popup hiding, lets
+    the same word be shown again.
+    """
+
+    def __init__(self):
+        # the word the pointer is on, as (view id, begin, end)
+        self.current_word = None
+        # bumped for every new word; callbacks for older generations are stale
+        self.generation = 0
+        # seq of the quick info request in flight for the current word, or None
+        self.hover_seq = None
+        # True once the popup for the current word was shown
+        self.shown = False
+        self.hover_count = 0
+        self.request_count = 0
+        self.cancel_count = 0
+        self.stale_count = 0
+
     def on_hover(self, view, point, hover_zone):
+        if hover_zone != sublime.HOVER_TEXT:
+            # the pointer left the text; coming back to the word shows it again
+            self.leave_word()
+            return
+        self.hover_count += 1
+        word = view.word(point)
+        word_key = (view.id(), word.begin(), word.end())
+        if word_key == self.current_word and (not self.shown or view.is_popup_visible()):
+            # still on the word whose quick info is pending or shown; once its
+            # popup hid, hovering the word again shows it again
+            return
+        self.leave_word()
+        self.current_word = word_key
+        generation = self.generation
+        dwell = sublime.load_settings("SublimeLsp.sublime-settings").get("hover_dwell_ms", HOVER_DWELL_MS)
+        sublime.set_timeout(lambda: self.on_dwell(view, point, generation), dwell)
+
+    def on_dwell(self, view, point, generation):
+        if generation != self.generation or not view.is_valid():
+            return
+        if not view.classify(point) & SUBLIME_WORD_MASK:
+            return
+        service = cli.get_service()
+        if not service:
+            return
+        check_update_view(view)
+        self.request_count += 1
+        self.hover_seq = service.quick_info(
+            view.file_name(),
+            get_location_from_position(view, point),
+            lambda response: self.on_quick_info(view, point, generation, response),
+            HOVER_SUPERSEDE_KIND)
+
+    def on_quick_info(self, view, point, generation, response):
+        if generation != self.generation:
+            self.stale_count += 1
+            return
+        self.hover_seq = None
+        if response["success"]:
+            # the command finds the response in the hover cache of the service
+            sublime.set_timeout(lambda: self.show(view, point, generation), 0)
+
+    def show(self, view, point, generation):
+        if generation != self.generation:
+            self.stale_count += 1
+            return
+        self.shown = True
         view.run_command('typescript_quick_info_doc', {"hover_point": point})
 
+    def leave_word(self):
+        """Forgets the current word, dropping its pending dwell and request"""
+        if self.hover_seq is not None:
+            self.cancel_in_flight()
+        self.current_word = None
+        self.shown = False
+        self.generation += 1
+
+    def cancel_in_flight(self):
+        """Cancels the quick info request for the word the pointer left"""
+        seq, self.hover_seq = self.hover_seq, None
+        service = cli.get_service()
+        if service and service.cancel(seq):
+            self.cancel_count += 1
+            log.debug('Cancelled quick info for a word the pointer left')
+
+    def get_stats(self):
+        saved = self.hover_count - self.request_count
+        return {
+            "hovers": self.hover_count,
+            "requests": self.request_count,
+            "saved": saved,
+            "saved_ratio": float(saved) / self.hover_count if self.hover_count else 0.0,
+            "cancelled": self.cancel_count,
+            "stale": self.stale_count
+        }
+
 listen = QuickInfoToolTipEventListener()
 EventHub.subscribe("on_hover", listen.on_hover)